@@ -1,73 +1,111 @@
-import json, argparse, openai
-
-
-# Parse arguments for human player's side and opponent's level
-parser = argparse.ArgumentParser()
-parser.add_argument("--side", help = "which side to play as; options: {white, black}", type = str)
-parser.add_argument("--level", help = "level of difficulty of AI opponent; options {easy, medium, hard}", type = str)
-args = parser.parse_args()
-
-# Exit if arguments are invalid
-if args.side not in ["white", "black"]:
-    exit('Invalid player. Please enter "white" or "black"')
-elif args.level not in ["easy", "medium", "hard"]:
-    exit('Invalid level. Please enter "easy", "medium", or "hard"')
-
-
-# Start up game window
-import src.gameplay as gp
-
-# Parse config.json for OpenAI API key and Stockfish path
-f = open("./config.json")
-data = json.load(f)
-f.close()
-
-# Initialize players
-if args.side == "white":
-    # Human is the white player
-    human_black = False
-    p1 = gp.HumanPlayer(path = data['STOCKFISH_PATH'], color = True)
-
-    if args.level == "easy":
-        # Easy opponent - alpha-beta
-        p2 = gp.ABPlayer(color = False, fail_hard = False)
-    elif args.level == "medium":
-        # Medium opponent - Stockfish
-        p2 = gp.StockfishPlayer(path = data['STOCKFISH_PATH'], color = False, depth = 4)
+import time
+
+# Launch time, the start of the startup timing report
+launch_time = time.perf_counter()
+
+import json, argparse
+
+
+# The guard keeps worker processes of the parallel alpha-beta search from re-running the game when they import this module
+if __name__ == "__main__":
+    # Parse arguments for human player's side and opponent's level
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--side", help = "which side to play as; options: {white, black}", type = str)
+    parser.add_argument("--level", help = "level of difficulty of AI opponent; options {easy, medium, hard}", type = str)
+    parser.add_argument("--workers", help = "number of processes for the easy opponent's search; default 1", type = int, default = 1)
+    args = parser.parse_args()
+
+    # Exit if arguments are invalid
+    if args.side not in ["white", "black"]:
+        exit('Invalid player. Please enter "white" or "black"')
+    elif args.level not in ["easy", "medium", "hard"]:
+        exit('Invalid level. Please enter "easy", "medium", or "hard"')
+    elif args.workers < 1:
+        exit('Invalid number of workers. Please enter a positive integer')
+
+
+    # Start up game window first, the rest is set up while it is shown
+    from src.startup import StartupTimer
+    timer = StartupTimer(launch_time)
+    import src.gameplay as gp
+    timer.mark("modules imported")
+    gp.init_display()
+    timer.mark("window shown")
+
+    from src.engine_pool import EnginePool
+    from src.analysis_cache import AnalysisCache
+    from src.commentary_cache import CommentaryCache
+    from src.llm import LLMClient, OpenAIBackend, HTTPBackend
+
+    # Parse config.json for OpenAI API key and Stockfish path
+    f = open("./config.json")
+    data = json.load(f)
+    f.close()
+
+    # Load the opening book shared by all players, if one is configured
+    book = None
+    if 'BOOK_PATH' in data:
+        from src.book import OpeningBook
+        book = OpeningBook(data['BOOK_PATH'], max_ply = data.get('BOOK_MAX_PLY', 12))
+
+    # Stockfish engines shared by the tutor and the opponent, and their analyses kept across sessions
+    # The engines start in the background, one for the tutor and one for a Stockfish opponent
+    pool = EnginePool(data['STOCKFISH_PATH'])
+    pool.warm(1 if args.level == "easy" else 2, on_ready = lambda: timer.mark("engines started"))
+    analysis_cache = AnalysisCache(data.get('ANALYSIS_CACHE_PATH', "analysis_cache.db"))
+    commentary_cache = CommentaryCache(data.get('COMMENTARY_CACHE_PATH', "commentary_cache.db"))
+
+    # Initialize players
+    if args.side == "white":
+        # Human is the white player
+        human_black = False
+        p1 = gp.HumanPlayer(path = data['STOCKFISH_PATH'], color = True, book = book, pool = pool,
+                            analysis_cache = analysis_cache, commentary_cache = commentary_cache)
+
+        if args.level == "easy":
+            # Easy opponent - alpha-beta
+            p2 = gp.ABPlayer(color = False, fail_hard = False, workers = args.workers, book = book)
+        elif args.level == "medium":
+            # Medium opponent - Stockfish
+            p2 = gp.StockfishPlayer(path = data['STOCKFISH_PATH'], color = False, depth = 4, book = book, pool = pool,
+                                    analysis_cache = analysis_cache)
+        else:
+            # Hard opponent - Stockfish
+            p2 = gp.StockfishPlayer(path = data['STOCKFISH_PATH'], color = False, book = book, pool = pool,
+                                    analysis_cache = analysis_cache)
     else:
-        # Hard opponent - Stockfish
-        p2 = gp.StockfishPlayer(path = data['STOCKFISH_PATH'], color = False)
-else:
-    # Human is the black player
-    human_black = True
-    p2 = gp.HumanPlayer(path = data['STOCKFISH_PATH'], color = False)
-
-    if args.level == "easy":
-        # Easy opponent - alpha-beta
-        p1 = gp.ABPlayer(color = True, fail_hard = False)
-    elif args.level == "medium":
-        # Medium opponent - Stockfish
-        p1 = gp.StockfishPlayer(path = data['STOCKFISH_PATH'], color = True, depth = 4)
+        # Human is the black player
+        human_black = True
+        p2 = gp.HumanPlayer(path = data['STOCKFISH_PATH'], color = False, book = book, pool = pool,
+                            analysis_cache = analysis_cache, commentary_cache = commentary_cache)
+
+        if args.level == "easy":
+            # Easy opponent - alpha-beta
+            p1 = gp.ABPlayer(color = True, fail_hard = False, workers = args.workers, book = book)
+        elif args.level == "medium":
+            # Medium opponent - Stockfish
+            p1 = gp.StockfishPlayer(path = data['STOCKFISH_PATH'], color = True, depth = 4, book = book, pool = pool,
+                                    analysis_cache = analysis_cache)
+        else:
+            # Hard opponent - Stockfish
+            p1 = gp.StockfishPlayer(path = data['STOCKFISH_PATH'], color = True, book = book, pool = pool,
+                                    analysis_cache = analysis_cache)
+
+    # Initialize ChatGPT client, or a client for a local OpenAI-compatible server if one is configured
+    # No request is made until the first commentary, which carries its own instructions
+    if 'LLM_URL' in data:
+        backend = HTTPBackend(data['LLM_URL'], api_key = data.get('OPENAI_API_KEY'))
     else:
-        # Hard opponent - Stockfish
-        p1 = gp.StockfishPlayer(path = data['STOCKFISH_PATH'], color = True)
-
-# Initialize ChatGPT instance and prime with introduction
-openai.api_key = data['OPENAI_API_KEY']
-model_engine = "gpt-3.5-turbo"
-intro_message = f"You are a chess tutor for a beginner player playing as {args.side}."
-
-response = openai.ChatCompletion.create(
-    model=model_engine,
-    messages=[
-        {"role": "system", "content": intro_message},
-        {"role": "user", "content": "Hello, ChatGPT!"},
-    ],
-    max_tokens=100
-)
-
-message = response.choices[0]['message']
-print(f"Chess tutor for {args.side} player is ready. Have fun!")
-
-# Play game
-gp.play_game(p1, p2, human_black)
+        backend = OpenAIBackend(api_key = data['OPENAI_API_KEY'])
+    gp.llm_client = LLMClient(backend, requests_per_minute = data.get('LLM_REQUESTS_PER_MINUTE', 60))
+    timer.mark("players ready")
+
+    print(f"Chess tutor for {args.side} player is ready. Have fun!")
+
+    # Play game
+    try:
+        gp.play_game(p1, p2, human_black)
+    finally:
+        pool.close()
+        analysis_cache.close()
+        commentary_cache.close()
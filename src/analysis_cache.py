@@ -0,0 +1,101 @@
+from src.cache import PersistentCache
+
+
+def analysis_key(board, depth = None, time_limit = None, skill = None):
+    """
+    Get the analysis cache key of a board state and search limits.
+
+    Parameters
+    ----------
+    board : chess.Board
+        Chess board representing the board state.
+    depth : int, default=None
+        The maximum search depth of the analysis.
+    time_limit : float, default=None
+        Time limit in seconds of the analysis.
+    skill : int, default=None
+        Skill level of the engine.
+
+    Returns
+    -------
+    str
+        FEN of the board state without move counters, followed by the search limits.
+    """
+    return "{}|{}|{}|{}".format(board.epd(), depth, time_limit, skill)
+
+class AnalysisCache():
+    """
+    On-disk cache of engine analyses, kept across sessions.
+    Analyses are keyed by board state and search limits and hold the best move, score and principal variation.
+    Recently used analyses are also kept in memory. When the database outgrows its size limit,
+    the least recently used analyses are deleted.
+    """
+    def __init__(self, path, max_entries = 200000, memory_entries = 4096):
+        """
+        Initialize cache, creating the database if it does not exist.
+
+        Parameters
+        ----------
+        path : str
+            Path to the SQLite database file.
+        max_entries : int, default=200000
+            Maximum number of analyses kept in the database.
+        memory_entries : int, default=4096
+            Maximum number of analyses kept in memory.
+        """
+        self.store = PersistentCache(path, "engine_analysis", max_entries = max_entries, memory_entries = memory_entries)
+
+    def get(self, key):
+        """
+        Get the analysis stored for a key.
+
+        Parameters
+        ----------
+        key : str
+            Key from analysis_key().
+
+        Returns
+        -------
+        tuple or None
+            Best move in UCI format, score in centipawns from white's point of view (None if unknown)
+            and principal variation as a tuple of moves in UCI format, or None if the key is not in the cache.
+        """
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        move, score, pv = entry
+        return move, score, tuple(pv)
+
+    def put(self, key, move, score, pv):
+        """
+        Store an analysis.
+
+        Parameters
+        ----------
+        key : str
+            Key from analysis_key().
+        move : str
+            Best move in UCI format.
+        score : int or None
+            Score in centipawns from white's point of view, or None if unknown.
+        pv : tuple of str
+            Principal variation in UCI format, starting with the best move.
+        """
+        self.store.put(key, [move, score, list(pv)])
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns
+        -------
+        dict
+            Hits, misses, stores, evictions, database errors and hit rate.
+        """
+        return self.store.stats()
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self.store.close()
@@ -0,0 +1,71 @@
+from src.search import iterative_deepening
+from src.transposition import TranspositionTable
+import chess
+
+
+# Test positions: opening, early middlegame, tactical middlegame ("Kiwipete") and rook endgame
+BENCHMARK_FENS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"
+]
+
+# Search configurations to compare, as keyword arguments to iterative_deepening()
+BENCHMARK_CONFIGS = {
+    "fail-hard": {"fail_hard": True},
+    "fail-soft": {"fail_hard": False},
+    "negamax": {"negamax": True, "pvs": False, "aspiration": False, "null_move": False, "lmr": False},
+    "negamax+pvs": {"negamax": True, "pvs": True, "aspiration": False, "null_move": False, "lmr": False},
+    "negamax+pvs+asp": {"negamax": True, "pvs": True, "aspiration": True, "null_move": False, "lmr": False},
+    "negamax+pvs+asp+null": {"negamax": True, "pvs": True, "aspiration": True, "null_move": True, "lmr": False},
+    "negamax+all": {"negamax": True, "pvs": True, "aspiration": True, "null_move": True, "lmr": True}
+}
+
+def compare_searches(fens = BENCHMARK_FENS, depth = 4, configs = BENCHMARK_CONFIGS, quiescence = True):
+    """
+    Search each position with each configuration and print the chosen move, score, node counts, time,
+    speed and first-move cutoff rate.
+
+    Parameters
+    ----------
+    fens : list of str, default=BENCHMARK_FENS
+        FEN strings of the board states to search.
+    depth : int, default=4
+        The search depth.
+    configs : dict, default=BENCHMARK_CONFIGS
+        Configuration names mapped to keyword arguments for iterative_deepening().
+    quiescence : bool, default=True
+        True to extend the search at the leaves with a capture-only quiescence search.
+
+    Returns
+    -------
+    dict
+        Configuration names mapped to total (nodes, quiescence nodes, seconds) over all positions.
+    """
+    totals = {name: (0, 0, 0.0) for name in configs}
+    for fen in fens:
+        print(fen)
+        for name, kwargs in configs.items():
+            board = chess.Board(fen)
+            moves, value, _, stats = iterative_deepening(board, depth, tt = TranspositionTable(), quiescence = quiescence, **kwargs)
+
+            print(f"  {name:<22} {moves[0] if moves else '-':<6} {value:>6} {stats.nodes:>9} {stats.qnodes:>9} {stats.seconds:>8.2f}s"
+                  f" {stats.nps():>9.0f} nps {stats.first_move_cutoff_rate():>5.0%}")
+            nodes, qnodes, total_seconds = totals[name]
+            totals[name] = (nodes + stats.nodes, qnodes + stats.qnodes, total_seconds + stats.seconds)
+
+    print("Totals:")
+    for name, (nodes, qnodes, seconds) in totals.items():
+        print(f"  {name:<22} {nodes:>9} {qnodes:>9} {seconds:>8.2f}s")
+    return totals
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", help = "search depth; default 4", type = int, default = 4)
+    args = parser.parse_args()
+
+    compare_searches(depth = args.depth)
@@ -0,0 +1,75 @@
+import chess.polyglot
+import random
+
+
+# Reference: http://hgm.nubati.net/book_format.html
+
+class OpeningBook():
+    """
+    Polyglot opening book read from a local .bin file.
+    The file is memory-mapped and its entries, sorted by Zobrist hash, are found by binary search.
+    """
+    def __init__(self, path, max_ply = 12, best = False, seed = None):
+        """
+        Initialize book.
+
+        Parameters
+        ----------
+        path : str
+            Path to the Polyglot book file.
+        max_ply : int, default=12
+            Number of plies from the start of the game after which the book is no longer used.
+        best : bool, default=False
+            True to always play the book move with the highest weight,
+            False to choose a book move at random in proportion to its weight.
+        seed : int, default=None
+            Seed for the random choice of book moves. If None, the choice is not reproducible.
+        """
+        self.reader = chess.polyglot.open_reader(path)
+        self.max_ply = max_ply
+        self.best = best
+        self.random = random.Random(seed)
+
+        # Number of lookups that found a book move and that did not
+        self.hits = 0
+        self.misses = 0
+
+    def get_move(self, board):
+        """
+        Get a book move for a board state.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+
+        Returns
+        -------
+        chess.Move or None
+            Book move for the board state, or None if the board state is past the maximum ply or not in the book.
+        """
+        if board.ply() >= self.max_ply:
+            return None
+
+        try:
+            if self.best:
+                entry = self.reader.find(board)
+            else:
+                entry = self.reader.weighted_choice(board, random = self.random)
+        except IndexError:
+            self.misses += 1
+            return None
+
+        # Book files can hold moves that are illegal in the board state due to hash collisions
+        move = entry.move
+        if move not in board.legal_moves:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return move
+
+    def close(self):
+        """
+        Close the book file.
+        """
+        self.reader.close()
@@ -0,0 +1,303 @@
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+
+
+# Number of stores between checks of the size limit of a persistent cache
+EVICTION_INTERVAL = 256
+
+class LRUCache():
+    """
+    Fixed-size key-value cache that evicts the least recently used entry when full.
+    Counts hits, misses and evictions.
+    """
+    def __init__(self, max_entries):
+        """
+        Initialize cache.
+
+        Parameters
+        ----------
+        max_entries : int
+            Maximum number of entries kept in the cache.
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default = None):
+        """
+        Get the value stored for a key and mark it as most recently used.
+
+        Parameters
+        ----------
+        key : hashable
+            The key to look up.
+        default : object, default=None
+            Value returned if the key is not in the cache.
+
+        Returns
+        -------
+        object
+            The stored value, or default if the key is not in the cache.
+        """
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value for a key, evicting the least recently used entry if the cache is full.
+
+        Parameters
+        ----------
+        key : hashable
+            The key to store the value under.
+        value : object
+            The value to store.
+        """
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self.max_entries:
+            entries.popitem(last = False)
+            self.evictions += 1
+        entries[key] = value
+
+    def clear(self):
+        """
+        Remove all entries. The counters are kept.
+        """
+        self.entries.clear()
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns
+        -------
+        dict
+            Number of entries, maximum number of entries, hits, misses, evictions and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0
+        }
+
+class PersistentCache():
+    """
+    Key-value cache stored in an SQLite database, kept across sessions, with an LRUCache in front of it.
+    Values are stored as JSON. Entries expire after a time to live, and when the database outgrows its size limit
+    the least recently used entries are deleted. Safe to share between threads.
+    """
+    def __init__(self, path, table, max_entries = 200000, memory_entries = 4096, ttl = None):
+        """
+        Initialize cache, creating the database and table if they do not exist.
+
+        Parameters
+        ----------
+        path : str
+            Path to the SQLite database file.
+        table : str
+            Name of the table holding the entries.
+        max_entries : int, default=200000
+            Maximum number of entries kept in the database. The limit is checked every EVICTION_INTERVAL stores.
+        memory_entries : int, default=4096
+            Maximum number of entries kept in memory.
+        ttl : float, default=None
+            Time in seconds after which an entry expires. If None, entries do not expire.
+        """
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory = LRUCache(memory_entries)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread = False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                                "created REAL NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)")
+        self.connection.commit()
+
+        # Use times of entries read from the database, written with the next store so that reads never leave
+        # a transaction open, which would lock out other sessions sharing the file
+        self.used = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def is_expired(self, created, now):
+        """
+        Check if an entry has outlived the time to live.
+
+        Parameters
+        ----------
+        created : float
+            Value of time.time() when the entry was stored.
+        now : float
+            Current value of time.time().
+
+        Returns
+        -------
+        bool
+            True if the entry expired, False if not.
+        """
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key):
+        """
+        Get the value stored for a key.
+
+        Parameters
+        ----------
+        key : str
+            The key to look up.
+
+        Returns
+        -------
+        object or None
+            The stored value, or None if the key is not in the cache, its entry expired or the database could not be read.
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and not self.is_expired(entry[1], now):
+                self.hits += 1
+                return entry[0]
+
+            try:
+                row = self.connection.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                # E.g. the database is locked by another session, which is treated as a miss
+                self.errors += 1
+                row = None
+            if row is None or self.is_expired(row[1], now):
+                self.misses += 1
+                return None
+            # Written with the next store, since the use time only matters for eviction
+            self.used[key] = now
+            self.hits += 1
+            value = json.loads(row[0])
+            self.memory.put(key, (value, row[1]))
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value for a key. If the database cannot be written, the value is only kept in memory.
+
+        Parameters
+        ----------
+        key : str
+            The key to store the value under.
+        value : object
+            The value to store. Must be serializable as JSON.
+        """
+        now = time.time()
+        with self.lock:
+            self.memory.put(key, (value, now))
+            self.used.pop(key, None)
+            try:
+                self.write_used()
+                self.connection.execute(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                                        (key, json.dumps(value), now, now))
+                self.stores += 1
+                if self.stores % EVICTION_INTERVAL == 0:
+                    self.evict(now)
+                self.connection.commit()
+            except sqlite3.Error:
+                # E.g. the database is locked by another session. The store is dropped rather than failing the caller
+                self.errors += 1
+                self.rollback()
+
+    def write_used(self):
+        """
+        Write the use times of entries read since the last store, in the current transaction. Called with the lock held.
+        """
+        if len(self.used) > 0:
+            self.connection.executemany(f"UPDATE {self.table} SET last_used = ? WHERE key = ?",
+                                        [(used, key) for key, used in self.used.items()])
+            self.used.clear()
+
+    def rollback(self):
+        """
+        Roll back the current transaction after a failed write. Called with the lock held.
+        """
+        try:
+            self.connection.rollback()
+        except sqlite3.Error:
+            pass
+
+    def evict(self, now):
+        """
+        Delete expired entries, then the least recently used entries beyond the size limit plus a tenth of the limit,
+        so that eviction does not run on every store. Called with the lock held.
+
+        Parameters
+        ----------
+        now : float
+            Current value of time.time().
+        """
+        if self.ttl is not None:
+            cursor = self.connection.execute(f"DELETE FROM {self.table} WHERE created < ?", (now - self.ttl,))
+            self.evictions += cursor.rowcount
+
+        count = self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        excess = count - self.max_entries + self.max_entries // 10
+        self.connection.execute(f"DELETE FROM {self.table} WHERE key IN "
+                                f"(SELECT key FROM {self.table} ORDER BY last_used LIMIT ?)", (excess,))
+        self.evictions += excess
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns
+        -------
+        dict
+            Hits, misses, stores, evictions, database errors and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.0
+        }
+
+    def close(self):
+        """
+        Write pending use times and close the database.
+        """
+        with self.lock:
+            try:
+                self.write_used()
+                self.connection.commit()
+            except sqlite3.Error:
+                self.rollback()
+            self.connection.close()
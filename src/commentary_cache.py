@@ -0,0 +1,95 @@
+from src.cache import PersistentCache
+
+
+# Time in seconds after which cached commentary expires
+COMMENTARY_TTL = 30 * 24 * 60 * 60
+
+def commentary_key(board, move, prompt_version):
+    """
+    Get the commentary cache key of a board state, suggested move and prompt.
+
+    Parameters
+    ----------
+    board : chess.Board
+        Chess board representing the board state the move is suggested in.
+    move : chess.Move
+        The suggested move.
+    prompt_version : int
+        Version of the prompt the commentary was generated with.
+
+    Returns
+    -------
+    str
+        FEN of the board state without move counters, followed by the move in UCI format and the prompt version.
+    """
+    return "{}|{}|{}".format(board.epd(), move.uci(), prompt_version)
+
+class CommentaryCache():
+    """
+    On-disk cache of ChatGPT commentary on suggested moves, kept across sessions and shared by all players
+    using the same file. Recently used commentary is also kept in memory. Commentary expires after a time to live,
+    and when the database outgrows its size limit the least recently used commentary is deleted.
+    """
+    def __init__(self, path, max_entries = 50000, memory_entries = 1024, ttl = COMMENTARY_TTL):
+        """
+        Initialize cache, creating the database if it does not exist.
+
+        Parameters
+        ----------
+        path : str
+            Path to the SQLite database file.
+        max_entries : int, default=50000
+            Maximum number of commentaries kept in the database.
+        memory_entries : int, default=1024
+            Maximum number of commentaries kept in memory.
+        ttl : float, default=COMMENTARY_TTL
+            Time in seconds after which commentary expires. If None, commentary does not expire.
+        """
+        self.store = PersistentCache(path, "commentary", max_entries = max_entries, memory_entries = memory_entries,
+                                     ttl = ttl)
+
+    def get(self, key):
+        """
+        Get the commentary stored for a key.
+
+        Parameters
+        ----------
+        key : str
+            Key from commentary_key().
+
+        Returns
+        -------
+        str or None
+            The commentary, or None if the key is not in the cache or its commentary expired.
+        """
+        return self.store.get(key)
+
+    def put(self, key, text):
+        """
+        Store commentary.
+
+        Parameters
+        ----------
+        key : str
+            Key from commentary_key().
+        text : str
+            The commentary.
+        """
+        self.store.put(key, text)
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns
+        -------
+        dict
+            Hits, misses, stores, evictions, database errors and hit rate.
+        """
+        return self.store.stats()
+
+    def close(self):
+        """
+        Close the database.
+        """
+        self.store.close()
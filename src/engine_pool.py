@@ -0,0 +1,252 @@
+import chess.engine
+import concurrent.futures
+import threading
+
+
+# UCI option names for the per-lease engine options
+LEASE_OPTIONS = {"threads": "Threads", "hash_size": "Hash", "skill": "Skill Level"}
+
+class EngineLease():
+    """
+    A Stockfish engine lent out by an EnginePool, with the search limit and engine options of one request.
+    """
+    def __init__(self, engine, limit, options):
+        """
+        Initialize lease.
+
+        Parameters
+        ----------
+        engine : chess.engine.SimpleEngine
+            The lent engine.
+        limit : chess.engine.Limit
+            Search limit of the request.
+        options : dict
+            UCI options set on the engine for the request, restored to their defaults when the engine is returned.
+        """
+        self.engine = engine
+        self.limit = limit
+        self.options = options
+
+class EnginePool():
+    """
+    Long-lived Stockfish processes shared by the tutor, the opponent and consecutive games in one process.
+    Engines are started when no idle one is available, health-checked before they are lent out and
+    restarted if they crashed.
+    """
+    def __init__(self, path, max_idle = 2):
+        """
+        Initialize pool. No engine is started until the first lease.
+
+        Parameters
+        ----------
+        path : str
+            Path to the Stockfish engine.
+        max_idle : int, default=2
+            Maximum number of idle engines kept running. Engines returned beyond this are shut down.
+        """
+        self.path = path
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        # Signalled when an engine started by warm() becomes idle
+        self.ready = threading.Condition(self.lock)
+        # Number of engines being started by warm()
+        self.warming = 0
+        # Set by close(), after which engines that finish starting are shut down instead of kept
+        self.closed = False
+
+        # Number of engines started, including restarts, and of leases served
+        self.spawned = 0
+        self.restarts = 0
+        self.leases = 0
+
+    def spawn(self):
+        """
+        Start a new engine.
+
+        Returns
+        -------
+        chess.engine.SimpleEngine
+            The new engine.
+        """
+        self.spawned += 1
+        return chess.engine.SimpleEngine.popen_uci(self.path)
+
+    def warm(self, count = 1, on_ready = None):
+        """
+        Start engines in a background thread, so that the first lease does not wait for an engine to start.
+        Leases requested while the engines start wait for them instead of starting more.
+
+        Parameters
+        ----------
+        count : int, default=1
+            Number of engines to start, up to the maximum number of idle engines.
+        on_ready : callable, default=None
+            Called without arguments once the engines started. Not called if an engine failed to start.
+        """
+        with self.lock:
+            count = min(count, self.max_idle - len(self.idle))
+            if count <= 0:
+                return
+            self.warming += count
+
+        def run():
+            started = 0
+            try:
+                for _ in range(count):
+                    engine = self.spawn()
+                    with self.lock:
+                        self.warming -= 1
+                        started += 1
+                        closed = self.closed
+                        if not closed:
+                            self.idle.append(engine)
+                            self.ready.notify()
+                    if closed:
+                        self.close_engine(engine)
+                        return
+            finally:
+                with self.lock:
+                    # Let waiting leases start their own engines if an engine failed to start
+                    self.warming -= count - started
+                    self.ready.notify_all()
+            if on_ready is not None:
+                on_ready()
+
+        threading.Thread(target = run, daemon = True).start()
+
+    def is_healthy(self, engine):
+        """
+        Check if an engine still answers.
+
+        Parameters
+        ----------
+        engine : chess.engine.SimpleEngine
+            The engine to check.
+
+        Returns
+        -------
+        bool
+            True if the engine answered a ping in time, False if it crashed or hangs.
+        """
+        try:
+            engine.ping()
+            return True
+        except (chess.engine.EngineError, concurrent.futures.TimeoutError, RuntimeError):
+            return False
+
+    def acquire(self, depth = None, time_limit = None, threads = None, hash_size = None, skill = None, wait = True):
+        """
+        Lend out an engine for one request. Return it with release().
+
+        Parameters
+        ----------
+        depth : int, default=None
+            The maximum search depth. If None, the depth is not limited.
+        time_limit : float, default=None
+            Time limit in seconds of each search. If None, the time is not limited.
+        threads : int, default=None
+            Number of search threads. If None, the engine's default is used.
+        hash_size : int, default=None
+            Size of the engine's hash table in MB. If None, the engine's default is used.
+        skill : int, default=None
+            Skill level from 0 to 20. If None, the engine plays at full strength.
+        wait : bool, default=True
+            True to wait for an engine being started or start a new one if no engine is idle.
+            False to return None instead, for requests that are not worth waiting for.
+            An idle engine is still health-checked, which waits up to the engine's ping timeout if it hangs.
+
+        Returns
+        -------
+        EngineLease or None
+            The lent engine with the search limit and options of the request, or None if wait is False
+            and no engine was idle.
+        """
+        engine = None
+        with self.lock:
+            # Wait for an engine being started by warm()
+            while wait and len(self.idle) == 0 and self.warming > 0:
+                self.ready.wait()
+            while len(self.idle) > 0 and engine is None:
+                engine = self.idle.pop()
+                if not self.is_healthy(engine):
+                    self.close_engine(engine)
+                    self.restarts += 1
+                    engine = None
+            if engine is None and not wait:
+                return None
+            self.leases += 1
+        if engine is None:
+            engine = self.spawn()
+
+        options = {}
+        requested = {"threads": threads, "hash_size": hash_size, "skill": skill}
+        for name, value in requested.items():
+            if value is not None and LEASE_OPTIONS[name] in engine.options:
+                options[LEASE_OPTIONS[name]] = value
+        if len(options) > 0:
+            engine.configure(options)
+
+        return EngineLease(engine, chess.engine.Limit(time = time_limit, depth = depth), options)
+
+    def release(self, lease):
+        """
+        Take back a lent engine. Options set for the lease are restored to their defaults.
+        The engine starts a new game (clearing its hash table) the next time it searches for a different caller.
+
+        Parameters
+        ----------
+        lease : EngineLease
+            The lease to end. The lease must not be used afterwards.
+        """
+        engine = lease.engine
+        lease.engine = None
+        try:
+            if len(lease.options) > 0:
+                engine.configure({name: engine.options[name].default for name in lease.options})
+        except (chess.engine.EngineError, concurrent.futures.TimeoutError, RuntimeError):
+            # The engine crashed during the lease
+            self.close_engine(engine)
+            return
+
+        with self.lock:
+            if not self.closed and len(self.idle) < self.max_idle:
+                self.idle.append(engine)
+                return
+        self.close_engine(engine)
+
+    def close_engine(self, engine):
+        """
+        Shut down an engine, ignoring errors if it already crashed.
+
+        Parameters
+        ----------
+        engine : chess.engine.SimpleEngine
+            The engine to shut down.
+        """
+        try:
+            engine.quit()
+        except (chess.engine.EngineError, concurrent.futures.TimeoutError, RuntimeError):
+            engine.close()
+
+    def stats(self):
+        """
+        Get the pool statistics.
+
+        Returns
+        -------
+        dict
+            Number of idle engines, engines started, crashed engines restarted and leases served.
+        """
+        return {"idle": len(self.idle), "spawned": self.spawned, "restarts": self.restarts, "leases": self.leases}
+
+    def close(self):
+        """
+        Shut down all idle engines, and engines still being started by warm() once they are started.
+        Necessary for a clean exit once no more games are played.
+        """
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for engine in idle:
+            self.close_engine(engine)
@@ -1,3 +1,5 @@
+from src.cache import LRUCache
+from src.transposition import position_key
 import chess
 import numpy as np
 
@@ -82,6 +84,30 @@ pst = {
                        [-50, -30, -30, -30, -30, -30, -30, -50]])
  }
 
+# Game phase weight of each piece type, indexed by piece type. The phase is 24 with all pieces on the board
+# and goes down to 0 when only kings and pawns are left.
+# Reference: https://www.chessprogramming.org/Tapered_Eval
+PHASE_WEIGHTS = [0, 0, 1, 1, 2, 4, 0]
+MAX_PHASE = 24
+
+def game_phase(board):
+    """
+    Get the game phase of a board state from the number of knights, bishops, rooks and queens left.
+
+    Parameters
+    ----------
+    board : chess.Board
+        Chess board representing the current board state.
+
+    Returns
+    -------
+    int
+        Game phase from 0 (only kings and pawns left) to MAX_PHASE (all pieces on the board).
+    """
+    phase = (chess.popcount(board.knights) + chess.popcount(board.bishops) +
+             2 * chess.popcount(board.rooks) + 4 * chess.popcount(board.queens))
+    return min(phase, MAX_PHASE)
+
 def is_endgame(board):
     """
     Check if a chess board reflects a game that is almost finished. The end of a game starts if:
@@ -98,25 +124,40 @@ def is_endgame(board):
     bool
         True if the board reflects a game that is in the end stage, False if not.
     """
-    fen_str = board.board_fen()
-    if fen_str.lower().count('q') == 0:
-        # Both sides have no queen
-        return True
-    else:
-        # Check if each side has a queen
-        white_check = not ('Q' in fen_str)
-        black_check = not ('q' in fen_str)
+    white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
 
-        # Check if every side that has a queen has additionally
-        # no other pieces or one minor (not king or queen) piece maximum
-        if not white_check and sum(int(c.isupper()) for c in fen_str) <= 3:
-            white_check = True
-        if not black_check and sum(int(c.islower()) for c in fen_str) <= 3:
-            black_check = True
+    # Check if every side that has a queen has additionally
+    # no other pieces or one minor (not king or queen) piece maximum
+    white_check = not (board.queens & white) or chess.popcount(white) <= 3
+    black_check = not (board.queens & black) or chess.popcount(black) <= 3
 
-        return white_check and black_check
+    return white_check and black_check
 
-def get_board_points(board):
+def tapered_king_points(color, square_num, phase):
+    """
+    Get the points of a king, blending the middle and end piece-square tables by game phase.
+
+    Parameters
+    ----------
+    color : chess.Color
+        The king's color.
+    square_num : int
+        The king's square (0-63).
+    phase : int
+        Game phase from 0 to MAX_PHASE, as returned by game_phase().
+
+    Returns
+    -------
+    int
+        The king's total points, positive if white and negative if black.
+    """
+    if color == chess.BLACK:
+        square_num = chess.square_mirror(square_num)
+    square_coords = (chess.square_file(square_num), chess.square_rank(square_num))
+    bonus = (int(pst['K_middle'][square_coords]) * phase + int(pst['K_end'][square_coords]) * (MAX_PHASE - phase)) // MAX_PHASE
+    return (1 if color == chess.WHITE else -1) * (points['K'] + bonus)
+
+def get_board_points(board, tapered = False):
     """
     Calculate the heuristic value for a board state.
 
@@ -124,15 +165,28 @@ def get_board_points(board):
     ----------
     board : chess.Board
         Chess board representing the current board state.
+    tapered : bool, default=False
+        True to blend the middle and end king piece-square tables by game phase,
+        False to pick one of them with is_endgame().
 
     Returns
     -------
     int
         The heuristic value for the board state.
     """
+    # Decide the piece-square table to use for the king, once for both kings
+    if tapered:
+        phase = game_phase(board)
+    else:
+        king_table = "K_end" if is_endgame(board) else "K_middle"
+
     # Iterate through each non-captured piece on the board
     points_diff = 0
     for square_num, piece in board.piece_map().items():
+        if tapered and piece.piece_type == chess.KING:
+            points_diff += tapered_king_points(piece.color, square_num, phase)
+            continue
+
         symbol = piece.symbol()
 
         # Sign for total points for the piece - positive if white and negative if black
@@ -145,14 +199,410 @@ def get_board_points(board):
         # Get coordinates of square on board (0-7, 0-7)
         square_coords = (chess.square_file(square_num), chess.square_rank(square_num))
 
-        # Decide the piece-square table to use for the king
-        if symbol.upper() == "K":
-            if is_endgame(board):
-                symbol += "_end"
-            else:
-                symbol += "_middle"
+        symbol = symbol.upper()
+        table = king_table if symbol == "K" else symbol
 
         # Get the piece's total points: fixed piece type points + bonus points for position
-        points_diff += pts_sign * pst[symbol.capitalize()][square_coords]
+        points_diff += pts_sign * (points[symbol] + pst[table][square_coords])
 
     return points_diff
+
+
+# Precomputed points (fixed piece points + piece-square bonus) for each piece on each square,
+# indexed by [color][piece type][square]. Black points are negative.
+square_points = [[[0] * 64 for _ in range(7)] for _ in chess.COLORS]
+# King points indexed by [color][endgame][square]
+king_points = [[[0] * 64 for _ in range(2)] for _ in chess.COLORS]
+
+for color in chess.COLORS:
+    sign = 1 if color == chess.WHITE else -1
+    for square_num in chess.SQUARES:
+        # Black pieces use the mirrored square, as in get_board_points()
+        table_square = square_num if color == chess.WHITE else chess.square_mirror(square_num)
+        square_coords = (chess.square_file(table_square), chess.square_rank(table_square))
+
+        for piece_type in [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]:
+            symbol = chess.piece_symbol(piece_type).upper()
+            square_points[color][piece_type][square_num] = sign * int(points[symbol] + pst[symbol][square_coords])
+
+        king_points[color][False][square_num] = sign * int(points['K'] + pst['K_middle'][square_coords])
+        king_points[color][True][square_num] = sign * int(points['K'] + pst['K_end'][square_coords])
+
+class IncrementalEvaluator():
+    """
+    Heuristic value of a board state kept up to date move by move, instead of scanning every piece at each leaf.
+    Gives the same value as get_board_points().
+
+    The running sum covers all pieces except kings. Kings are added when evaluating,
+    since their piece-square table depends on whether the game is in the end stage.
+    """
+    def __init__(self, board, debug = False, tapered = False):
+        """
+        Initialize evaluator.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the board state to start from.
+        debug : bool, default=False
+            True to check every value against get_board_points(). Slow.
+        tapered : bool, default=False
+            True to blend the middle and end king piece-square tables by game phase, as in get_board_points().
+        """
+        self.debug = debug
+        self.tapered = tapered
+        self.reset(board)
+
+    def reset(self, board):
+        """
+        Recompute the running sums from scratch.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+        """
+        self.score = 0
+        for square_num, piece in board.piece_map().items():
+            if piece.piece_type != chess.KING:
+                self.score += square_points[piece.color][piece.piece_type][square_num]
+
+        # Piece counts for the end stage check, indexed by color (chess.BLACK is 0 and chess.WHITE is 1)
+        self.queens = [chess.popcount(board.queens & board.occupied_co[color]) for color in (chess.BLACK, chess.WHITE)]
+        self.pieces = [chess.popcount(board.occupied_co[color]) for color in (chess.BLACK, chess.WHITE)]
+        self.phase = (chess.popcount(board.knights) + chess.popcount(board.bishops) +
+                      2 * chess.popcount(board.rooks) + 4 * chess.popcount(board.queens))
+
+        # Saved state for each pushed move
+        self.stack = []
+
+    def push(self, board, move):
+        """
+        Update the running sums for a move. Must be called before the move is pushed on the board.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the board state before the move.
+        move : chess.Move
+            The move about to be pushed, or a null move.
+        """
+        queens, pieces = self.queens, self.pieces
+        self.stack.append((self.score, queens[0], queens[1], pieces[0], pieces[1], self.phase))
+
+        # Null move
+        if not move:
+            return
+
+        color = board.turn
+        from_square, to_square = move.from_square, move.to_square
+        piece_type = board.piece_type_at(from_square)
+        own_points = square_points[color]
+
+        if board.is_castling(move):
+            # Only the rook's points change
+            rank = chess.square_rank(from_square)
+            if board.is_kingside_castling(move):
+                rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+            else:
+                rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+            self.score += own_points[chess.ROOK][rook_to] - own_points[chess.ROOK][rook_from]
+            return
+
+        # Captured piece
+        if board.is_en_passant(move):
+            captured_square = to_square - 8 if color == chess.WHITE else to_square + 8
+            captured_type = chess.PAWN
+        else:
+            captured_square = to_square
+            captured_type = board.piece_type_at(to_square)
+        if captured_type is not None:
+            self.score -= square_points[not color][captured_type][captured_square]
+            self.phase -= PHASE_WEIGHTS[captured_type]
+            pieces[not color] -= 1
+            if captured_type == chess.QUEEN:
+                queens[not color] -= 1
+
+        # Moving piece, which becomes the promotion piece if promoting
+        if piece_type != chess.KING:
+            new_type = move.promotion if move.promotion is not None else piece_type
+            self.score += own_points[new_type][to_square] - own_points[piece_type][from_square]
+            if new_type != piece_type:
+                self.phase += PHASE_WEIGHTS[new_type] - PHASE_WEIGHTS[piece_type]
+                if new_type == chess.QUEEN:
+                    queens[color] += 1
+
+    def pop(self):
+        """
+        Undo the update for the last pushed move. Must be called when the move is popped from the board.
+        """
+        self.score, self.queens[0], self.queens[1], self.pieces[0], self.pieces[1], self.phase = self.stack.pop()
+
+    def is_endgame(self):
+        """
+        Check if the current board state reflects a game that is almost finished, with the same rules as is_endgame().
+
+        Returns
+        -------
+        bool
+            True if the board reflects a game that is in the end stage, False if not.
+        """
+        queens, pieces = self.queens, self.pieces
+        white_check = queens[chess.WHITE] == 0 or pieces[chess.WHITE] <= 3
+        black_check = queens[chess.BLACK] == 0 or pieces[chess.BLACK] <= 3
+        return white_check and black_check
+
+    def game_phase(self):
+        """
+        Get the game phase of the current board state, as returned by game_phase().
+
+        Returns
+        -------
+        int
+            Game phase from 0 (only kings and pawns left) to MAX_PHASE (all pieces on the board).
+        """
+        return min(self.phase, MAX_PHASE)
+
+    def evaluate(self, board):
+        """
+        Get the heuristic value for the current board state.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state, with all pushed moves applied.
+
+        Returns
+        -------
+        int
+            The heuristic value for the board state.
+        """
+        points_diff = self.score
+        if self.tapered:
+            phase = self.game_phase()
+            for color in chess.COLORS:
+                king_square = board.king(color)
+                if king_square is not None:
+                    points_diff += tapered_king_points(color, king_square, phase)
+        else:
+            endgame = self.is_endgame()
+            for color in chess.COLORS:
+                king_square = board.king(color)
+                if king_square is not None:
+                    points_diff += king_points[color][endgame][king_square]
+
+        if self.debug:
+            full_points = get_board_points(board, tapered = self.tapered)
+            assert points_diff == full_points, \
+                "Incremental evaluation {} does not match full evaluation {} for {}".format(points_diff, full_points, board.fen())
+
+        return points_diff
+
+
+# Order of the 12 piece bitboards in batch evaluation: white pawn to king, then black pawn to king
+BITBOARD_PIECES = [(color, piece_type) for color in [chess.WHITE, chess.BLACK] for piece_type in chess.PIECE_TYPES]
+
+# Points tensors for batch evaluation, indexed by [bitboard][square]. They only differ in the king rows.
+pst_tensor_middle = np.zeros((12, 64), dtype = np.int64)
+pst_tensor_end = np.zeros((12, 64), dtype = np.int64)
+for index, (color, piece_type) in enumerate(BITBOARD_PIECES):
+    if piece_type == chess.KING:
+        pst_tensor_middle[index] = king_points[color][False]
+        pst_tensor_end[index] = king_points[color][True]
+    else:
+        pst_tensor_middle[index] = square_points[color][piece_type]
+        pst_tensor_end[index] = square_points[color][piece_type]
+
+# Both tensors as columns of one (768, 2) matrix for the batch matrix product
+pst_matrix = np.stack([pst_tensor_middle.reshape(-1), pst_tensor_end.reshape(-1)], axis = 1).astype(np.float32)
+
+def pack_bitboards(boards):
+    """
+    Pack board states into piece bitboards.
+
+    Parameters
+    ----------
+    boards : list of chess.Board or str
+        Chess boards, or FEN strings of board states.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (N, 12) and type uint64 with one bitboard per piece type and color,
+        in the order of BITBOARD_PIECES.
+    """
+    packed = np.zeros((len(boards), 12), dtype = np.uint64)
+    for row, board in enumerate(boards):
+        if isinstance(board, str):
+            board = chess.Board(board)
+        for index, (color, piece_type) in enumerate(BITBOARD_PIECES):
+            packed[row, index] = board.pieces_mask(piece_type, color)
+    return packed
+
+def get_board_points_batch(positions, chunk_size = 65536):
+    """
+    Calculate the heuristic values for many board states at once with vectorized NumPy.
+    Gives the same values as get_board_points().
+
+    Parameters
+    ----------
+    positions : list of chess.Board or str, or numpy.ndarray
+        Chess boards, FEN strings of board states, or an array of shape (N, 12) of piece bitboards
+        as returned by pack_bitboards().
+    chunk_size : int, default=65536
+        Number of board states evaluated per vectorized step, to bound memory use.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (N,) with the heuristic value of each board state.
+    """
+    if isinstance(positions, np.ndarray):
+        packed = positions.astype('<u8', copy = False)
+    else:
+        packed = pack_bitboards(positions)
+
+    scores = np.zeros(len(packed), dtype = np.int64)
+    for start in range(0, len(packed), chunk_size):
+        chunk = packed[start:start + chunk_size]
+
+        # Unpack to one bit per square: (n, 12, 64), bit i of each bitboard is square i
+        bits = np.unpackbits(chunk.view(np.uint8), bitorder = 'little').reshape(len(chunk), 12, 64)
+
+        # End stage check, with the same rules as is_endgame()
+        counts = bits.sum(axis = 2, dtype = np.int64)
+        white_check = (counts[:, 4] == 0) | (counts[:, :6].sum(axis = 1) <= 3)
+        black_check = (counts[:, 10] == 0) | (counts[:, 6:].sum(axis = 1) <= 3)
+        endgame = white_check & black_check
+
+        # Middle and end scores in one matrix product. float32 is exact here since all sums are far below 2**24.
+        flat_bits = bits.reshape(len(chunk), 12 * 64).astype(np.float32)
+        chunk_scores = np.rint(flat_bits @ pst_matrix).astype(np.int64)
+        scores[start:start + len(chunk)] = np.where(endgame, chunk_scores[:, 1], chunk_scores[:, 0])
+
+    return scores
+
+
+# Approximate memory used by one cache entry (key, value and LRU bookkeeping), in bytes
+CACHE_ENTRY_BYTES = 160
+
+def pawn_key(board):
+    """
+    Get the hash of the pawns of a board state, ignoring all other pieces.
+
+    Parameters
+    ----------
+    board : chess.Board
+        Chess board representing the current board state.
+
+    Returns
+    -------
+    int
+        64-bit hash of the white and black pawn bitboards.
+    """
+    return hash((board.pawns & board.occupied_co[chess.WHITE], board.pawns & board.occupied_co[chess.BLACK]))
+
+class EvaluationCache():
+    """
+    Bounded LRU cache of heuristic values keyed by position_key(), paired with a pawn hash table
+    that stores the pawn structure score keyed by a hash of the pawn placement.
+    Gives the same values as get_board_points().
+    """
+    def __init__(self, max_bytes = 16 * 1024 * 1024, pawn_max_bytes = 1024 * 1024, tapered = False):
+        """
+        Initialize caches.
+
+        Parameters
+        ----------
+        max_bytes : int, default=16MB
+            Approximate memory budget of the evaluation cache, in bytes.
+        pawn_max_bytes : int, default=1MB
+            Approximate memory budget of the pawn hash table, in bytes.
+        tapered : bool, default=False
+            True to blend the middle and end king piece-square tables by game phase, as in get_board_points().
+        """
+        self.tapered = tapered
+        self.evaluations = LRUCache(max_bytes // CACHE_ENTRY_BYTES)
+        self.pawns = LRUCache(pawn_max_bytes // CACHE_ENTRY_BYTES)
+
+    def pawn_points(self, board):
+        """
+        Get the pawn structure score of a board state from the pawn hash table, computing it on a miss.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+
+        Returns
+        -------
+        int
+            Points of all pawns on the board, positive for white and negative for black.
+        """
+        key = pawn_key(board)
+        score = self.pawns.get(key)
+        if score is None:
+            score = 0
+            for color in chess.COLORS:
+                pawn_table = square_points[color][chess.PAWN]
+                for square_num in chess.scan_forward(board.pawns & board.occupied_co[color]):
+                    score += pawn_table[square_num]
+            self.pawns.put(key, score)
+        return score
+
+    def evaluate(self, board, key = None):
+        """
+        Get the heuristic value for a board state from the cache, computing it on a miss.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+        key : int, default=None
+            Key of the board state from position_key(), if already known.
+
+        Returns
+        -------
+        int
+            The heuristic value for the board state.
+        """
+        if key is None:
+            key = position_key(board)
+        points_diff = self.evaluations.get(key)
+        if points_diff is not None:
+            return points_diff
+
+        points_diff = self.pawn_points(board)
+        for color in chess.COLORS:
+            for piece_type in [chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]:
+                piece_table = square_points[color][piece_type]
+                for square_num in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                    points_diff += piece_table[square_num]
+
+        # Kings
+        if self.tapered:
+            phase = game_phase(board)
+        else:
+            endgame = is_endgame(board)
+        for color in chess.COLORS:
+            king_square = board.king(color)
+            if king_square is None:
+                continue
+            if self.tapered:
+                points_diff += tapered_king_points(color, king_square, phase)
+            else:
+                points_diff += king_points[color][endgame][king_square]
+
+        self.evaluations.put(key, points_diff)
+        return points_diff
+
+    def stats(self):
+        """
+        Get the statistics of the evaluation cache and the pawn hash table.
+
+        Returns
+        -------
+        dict
+            LRUCache.stats() of the evaluation cache ("evaluations") and of the pawn hash table ("pawns").
+        """
+        return {"evaluations": self.evaluations.stats(), "pawns": self.pawns.stats()}
@@ -1,64 +1,123 @@
-from src.search import alpha_beta_fail_hard, alpha_beta_fail_soft
+from src.transposition import EXACT, position_key
+from src.engine_pool import EnginePool
+from src.analysis_cache import analysis_key
+from src.commentary_cache import commentary_key
+from src.llm import LLMClient, OpenAIBackend
+from src.prompt import PROMPT_VERSION, build_prompt
+from src.rendering import BoardRenderer, get_font, BLACK, BACKGROUND
 import chess
 from chess import Move
 import chess.engine
-import chess.svg
-import numpy as np
-import openai, pygame
-import time, sys, math
+import pygame
+import time, sys, math, threading
 
 
 # Reference for GUI: https://blog.devgenius.io/simple-interactive-chess-gui-in-python-c6d6569f7b6c
 
-# Initialize display
+# Display size, the window is created by init_display()
 SCREEN_WIDTH = 1400
 SCREEN_HEIGHT = 900
-scrn = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.HWSURFACE|pygame.DOUBLEBUF|pygame.RESIZABLE)
-pygame.init()
+scrn = None
+
+# Maximum frames per second of the game loop
+FRAME_RATE = 30
+
+# Longest time in milliseconds the game loop sleeps while no events arrive
+MAX_WAIT = 1000
+
+# Commentary shown while ChatGPT's response is pending
+COMMENTARY_PLACEHOLDER = "ChatGPT is thinking about this move..."
 
 # Board size specifications for display
 SQUARE_SIZE = 100
 BOARD_OFFSET = 50
-BORDER_OFFSET = 6
-
-# Colors
-WHITE = (255, 255, 255)
-BLUE = (50, 255, 255)
-BLACK = (0, 0, 0)
-BACKGROUND = (232, 181, 132)
-BOARD_OUTLINE = (79, 40, 3)
-DARK_SQUARE = (216, 140, 68)
-LIGHT_SQUARE = (255, 204, 156)
-LATEST_MOVE = (120, 148, 84)
-
-# Initialize chess board
-b = chess.Board()
-print("Setting up the board...")
-
-# Load piece images
+
+# Piece images, loaded by init_display() once the window is shown
 IMAGE_PATH = "./images/"
+og_pieces = None
+pieces = None
 
-og_pieces = {
-    'p': pygame.image.load(IMAGE_PATH + 'bP.png').convert_alpha(),
-    'n': pygame.image.load(IMAGE_PATH + 'bN.png').convert_alpha(),
-    'b': pygame.image.load(IMAGE_PATH + 'bB.png').convert_alpha(),
-    'r': pygame.image.load(IMAGE_PATH + 'bR.png').convert_alpha(),
-    'q': pygame.image.load(IMAGE_PATH + 'bQ.png').convert_alpha(),
-    'k': pygame.image.load(IMAGE_PATH + 'bK.png').convert_alpha(),
-    'P': pygame.image.load(IMAGE_PATH + 'wP.png').convert_alpha(),
-    'N': pygame.image.load(IMAGE_PATH + 'wN.png').convert_alpha(),
-    'B': pygame.image.load(IMAGE_PATH + 'wB.png').convert_alpha(),
-    'R': pygame.image.load(IMAGE_PATH + 'wR.png').convert_alpha(),
-    'Q': pygame.image.load(IMAGE_PATH + 'wQ.png').convert_alpha(),
-    'K': pygame.image.load(IMAGE_PATH + 'wK.png').convert_alpha()
-}
-
-# Resized piece images
-pieces = {k: pygame.transform.scale(v, (SQUARE_SIZE, SQUARE_SIZE)) for k, v in og_pieces.items()}
+def init_display():
+    """
+    Create the game window and show it right away, then load the piece images.
+    Only the display and font modules of pygame are initialized, the others are slow to start and not used.
+    """
+    global scrn, og_pieces, pieces
+
+    pygame.display.init()
+    pygame.font.init()
+    scrn = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.HWSURFACE|pygame.DOUBLEBUF|pygame.RESIZABLE)
+    pygame.display.set_caption('Chess')
+
+    # Show the first frame before anything else is loaded
+    print("Setting up the board...")
+    scrn.fill(BACKGROUND)
+    font = get_font(math.floor(32 * SCREEN_HEIGHT / 900))
+    drawText(scrn, "Setting up the board...", BLACK,
+             pygame.Rect(BOARD_OFFSET, BOARD_OFFSET, SCREEN_WIDTH - 2 * BOARD_OFFSET, SCREEN_HEIGHT - 2 * BOARD_OFFSET),
+             font, True, None)
+    pygame.display.flip()
+
+    # Load piece images
+    og_pieces = {
+        'p': pygame.image.load(IMAGE_PATH + 'bP.png').convert_alpha(),
+        'n': pygame.image.load(IMAGE_PATH + 'bN.png').convert_alpha(),
+        'b': pygame.image.load(IMAGE_PATH + 'bB.png').convert_alpha(),
+        'r': pygame.image.load(IMAGE_PATH + 'bR.png').convert_alpha(),
+        'q': pygame.image.load(IMAGE_PATH + 'bQ.png').convert_alpha(),
+        'k': pygame.image.load(IMAGE_PATH + 'bK.png').convert_alpha(),
+        'P': pygame.image.load(IMAGE_PATH + 'wP.png').convert_alpha(),
+        'N': pygame.image.load(IMAGE_PATH + 'wN.png').convert_alpha(),
+        'B': pygame.image.load(IMAGE_PATH + 'wB.png').convert_alpha(),
+        'R': pygame.image.load(IMAGE_PATH + 'wR.png').convert_alpha(),
+        'Q': pygame.image.load(IMAGE_PATH + 'wQ.png').convert_alpha(),
+        'K': pygame.image.load(IMAGE_PATH + 'wK.png').convert_alpha()
+    }
+
+    # Resized piece images
+    pieces = {k: pygame.transform.scale(v, (SQUARE_SIZE, SQUARE_SIZE)) for k, v in og_pieces.items()}
 
 
 # Board
 
+def wrapText(text, font, width):
+    """
+    Split text into lines that fit a width, wrapping at the last space where possible.
+    Reference: https://www.pygame.org/wiki/TextWrap.
+
+    Parameters
+    ----------
+    text : str
+        The text to wrap.
+    font : pygame.font.Font
+        Font the text is rendered with.
+    width : int
+        Maximum width of a line in pixels.
+
+    Returns
+    -------
+    list of int
+        Index in the text at which each line starts.
+    """
+    line_starts = []
+    start = 0
+    while start < len(text):
+        line_starts.append(start)
+        rest = text[start:]
+        i = 1
+
+        # Determine maximum width of line
+        while font.size(rest[:i])[0] < width and i < len(rest):
+            i += 1
+
+        # If we've wrapped the text, then adjust the wrap to the last word
+        # A word longer than the line is broken where the line is full
+        if i < len(rest) and rest.rfind(" ", 0, i) >= 0:
+            i = rest.rfind(" ", 0, i) + 1
+
+        start += i
+    return line_starts
+
 def drawText(surface, text, color, rect, font, aa, bkg):
     """
     Draw some text into an area of a surface.
@@ -72,39 +131,118 @@ def drawText(surface, text, color, rect, font, aa, bkg):
     # Get the height of the font
     fontHeight = font.size("Tg")[1]
 
-    while text:
-        i = 1
-
+    line_starts = wrapText(text, font, rect.width) + [len(text)]
+    for start, end in zip(line_starts[:-1], line_starts[1:]):
         # Determine if the row of text will be outside our area
         if y + fontHeight > rect.bottom:
-            break
-
-        # Determine maximum width of line
-        while font.size(text[:i])[0] < rect.width and i < len(text):
-            i += 1
-
-        # If we've wrapped the text, then adjust the wrap to the last word
-        if i < len(text): 
-            i = text.rfind(" ", 0, i) + 1
+            return text[start:]
 
         # Render the line and blit it to the surface
         if bkg:
-            image = font.render(text[:i], True, color, bkg)
+            image = font.render(text[start:end], True, color, bkg)
             image.set_colorkey(bkg)
         else:
-            image = font.render(text[:i], aa, color)
+            image = font.render(text[start:end], aa, color)
 
         surface.blit(image, (rect.left, y))
         y += fontHeight + lineSpacing
 
-        # Remove the text we just blitted
-        text = text[i:]
+    return ""
 
-    return text
+def commentary_rect():
+    """
+    Get the area of the side panel that holds ChatGPT's commentary.
+
+    Returns
+    -------
+    pygame.Rect
+        The commentary area of the game window.
+    """
+    return pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2) + BOARD_OFFSET * 3,
+                       math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 9 * 6))
+
+class CommentaryPanel():
+    """
+    Commentary area of the side panel, redrawn incrementally while streamed commentary arrives.
+    Only the last drawn line and the lines after it are redrawn when text is appended.
+    """
+    def __init__(self):
+        """
+        Initialize panel with no text drawn.
+        """
+        self.text = None
+        self.line_starts = []
+
+    def draw(self, surface, text, font):
+        """
+        Draw the commentary in full. Called by update().
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+            The screen displayed in the game window.
+        text : str or None
+            The commentary, or None if no commentary is shown.
+        font : pygame.font.Font
+            Font the commentary is rendered with.
+        """
+        self.text = text
+        self.line_starts = []
+        if text is None:
+            return
+        rect = commentary_rect()
+        self.line_starts = wrapText(text, font, rect.width)
+        drawText(surface, text, BLACK, rect, font, True, None)
+
+    def extend(self, surface, text):
+        """
+        Show longer commentary by redrawing from the last drawn line onward.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+            The screen displayed in the game window.
+        text : str
+            The commentary so far.
+
+        Returns
+        -------
+        bool
+            True if the panel was updated, False if the text does not extend the drawn text
+            and the whole window needs to be updated instead.
+        """
+        if self.text is None or not text.startswith(self.text):
+            return False
+        if text == self.text:
+            return True
+
+        font = get_font(math.floor(32 * SCREEN_HEIGHT / 900))
+        rect = commentary_rect()
+        line_height = font.size("Tg")[1] - 2
+
+        # Redraw from the start of the last drawn line, which may wrap differently with the new text
+        first_line = max(0, len(self.line_starts) - 1)
+        start = self.line_starts[first_line] if len(self.line_starts) > 0 else 0
+        y = rect.top + first_line * line_height
+        dirty = pygame.Rect(rect.left, y, rect.width, max(0, rect.bottom - y))
+
+        surface.fill(BACKGROUND, dirty)
+        drawText(surface, text[start:], BLACK, dirty, font, True, None)
+        self.line_starts = self.line_starts[:first_line] + [start + i for i in wrapText(text[start:], font, rect.width)]
+        self.text = text
+        pygame.display.update(dirty)
+        return True
+
+# Commentary area shown in the game window
+commentary_panel = CommentaryPanel()
+
+# Board drawn in the game window
+board_renderer = BoardRenderer()
 
 def update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares = None, latest_move = False):
     '''
     Updates the game window display.
+    Only the squares and the side panel text that changed since the last update are redrawn and updated on screen.
 
     Parameters
     ----------
@@ -124,152 +262,61 @@ def update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squ
         True if highlight_squares reflects the latest move that a player has made.
         False if highlight_squares reflects the possible squares a human player-selected piece can move to.
     '''
-    # Set screen background color
-    scrn.fill(BACKGROUND)
-
-    # Create a font object
-    font = pygame.font.Font('freesansbold.ttf', math.floor(32 * SCREEN_HEIGHT / 900))
-
-    # Letters and numbers to mark the sides of the board to denote squares
-    CHARACTER_LIST = ['A','B','C','D','E','F','G','H']
-    NUMBER_LIST = ['8','7','6','5','4','3','2','1']
+    # Get the font object
+    font = get_font(math.floor(32 * SCREEN_HEIGHT / 900))
 
-    # Draw border
-    pygame.draw.rect(scrn, BOARD_OUTLINE, pygame.Rect(BOARD_OFFSET - (SQUARE_SIZE / 100 * BORDER_OFFSET),
-                                                      BOARD_OFFSET - (SQUARE_SIZE / 100 * BORDER_OFFSET),
-                                                      8 * SQUARE_SIZE + (2 * SQUARE_SIZE / 100) * BORDER_OFFSET,
-                                                      8 * SQUARE_SIZE + (2 * SQUARE_SIZE / 100) * BORDER_OFFSET), 5)
-
-    # Flip board if human is playing as black
-    if human_black:
-        board = board.transform(chess.flip_vertical).transform(chess.flip_horizontal)
-
-    # Start by drawing dark-colored square for the board, alternating
-    dark_square = True
-
-    for i in range(64):
-        # Draw board squares
-        if dark_square:
-            pygame.draw.rect(scrn, DARK_SQUARE, pygame.Rect(BOARD_OFFSET + (i % 8) * SQUARE_SIZE,
-                                                            BOARD_OFFSET + (7 * SQUARE_SIZE) - (i // 8) * SQUARE_SIZE,
-                                                            SQUARE_SIZE, SQUARE_SIZE))
-        else:
-            pygame.draw.rect(scrn, LIGHT_SQUARE, pygame.Rect(BOARD_OFFSET + (i % 8) * SQUARE_SIZE,
-                                                             BOARD_OFFSET + (7 * SQUARE_SIZE) - (i // 8) * SQUARE_SIZE,
-                                                             SQUARE_SIZE, SQUARE_SIZE))
-        if i % 8 != 7:
-            dark_square = not dark_square
-
-        # Draw pieces
-        piece = board.piece_at(i)
-        if piece == None:
-            pass
-        else:
-            scrn.blit(pieces[str(piece)], (BOARD_OFFSET + (i % 8) * SQUARE_SIZE,
-                                           BOARD_OFFSET + (7 * SQUARE_SIZE) - (i // 8) * SQUARE_SIZE))
-    
-    # Draw letters and numbers
-    for i in range(8):
-
-        # Text surface object for letters
-        if human_black:
-            text_letter = font.render(CHARACTER_LIST[7 - i], True, BLACK, BACKGROUND)
-        else:
-            text_letter = font.render(CHARACTER_LIST[i], True, BLACK, BACKGROUND)
-
-        # Rectangular object for the text surface object
-        textLetterRect = text_letter.get_rect()
-
-        # Set the center of the rectangular object
-        textLetterRect.center = (2 * BOARD_OFFSET + i * SQUARE_SIZE, int(BOARD_OFFSET / 2))
-
-        scrn.blit(text_letter, textLetterRect)
-
-        # Text surface object for numbers
-        if human_black:
-            text_number = font.render(NUMBER_LIST[7 - i], True, BLACK, BACKGROUND)
-        else:
-            text_number = font.render(NUMBER_LIST[i], True, BLACK, BACKGROUND)
-
-        # Rectangular object for the text surface object
-        textNumberRect = text_number.get_rect()
-
-        # Set the center of the rectangular object
-        textNumberRect.center = (int(BOARD_OFFSET / 2), 2 * BOARD_OFFSET + i * SQUARE_SIZE)
-
-        scrn.blit(text_number, textNumberRect)
-
-    # Draw lines
-    for i in range(7):
-        i = i + 1
-        pygame.draw.line(scrn, WHITE, (BOARD_OFFSET + 0, BOARD_OFFSET + i * SQUARE_SIZE),
-                         (BOARD_OFFSET + 8 * SQUARE_SIZE, BOARD_OFFSET + i * SQUARE_SIZE))
-        pygame.draw.line(scrn, WHITE, (BOARD_OFFSET + i * SQUARE_SIZE, BOARD_OFFSET),
-                         (BOARD_OFFSET + i * SQUARE_SIZE, BOARD_OFFSET + 8 * SQUARE_SIZE))
-
-    # Draw boxes around squares to highlight
-    if highlight_squares != None:
-        if latest_move:
-            # Highlighted square reflects the latest move a player made
-            for square in highlight_squares:
-                x = BOARD_OFFSET + SQUARE_SIZE * chess.square_file(square)
-                y = BOARD_OFFSET + SQUARE_SIZE * (7 - chess.square_rank(square))
-                pygame.draw.rect(scrn, LATEST_MOVE, pygame.Rect(x, y, SQUARE_SIZE, SQUARE_SIZE), 5)
-        else:
-            # Highlighted squares reflect the possible squares a human player-selected piece can move to
-            for square in highlight_squares:
-                x = BOARD_OFFSET + SQUARE_SIZE * chess.square_file(square)
-                y = BOARD_OFFSET + SQUARE_SIZE * (7 - chess.square_rank(square))
-                pygame.draw.rect(scrn, BLUE, pygame.Rect(x, y, SQUARE_SIZE, SQUARE_SIZE), 5)
+    # Draw the changed squares
+    dirty = board_renderer.draw_board(scrn, board, pieces, human_black, highlight_squares, latest_move,
+                                      SQUARE_SIZE, BOARD_OFFSET, font)
 
     # Text object for the current turn
     current_turn = who(board.turn).title()
     turn_text = "Current turn: {}".format(current_turn)
-    text_letter = font.render(turn_text, True, BLACK, WHITE)
-
-    textLetterRect = text_letter.get_rect()
-    textLetterRect.center = (2*BOARD_OFFSET+ 10*SQUARE_SIZE, int(BOARD_OFFSET/2))
-
-    drawText(scrn, turn_text, BLACK,
-             pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2),
-                         math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 9)),
-             font, True, None)
 
-    if suggested_move != None and chatGPT_text != None:
-        # Human player's turn
-        # Text object for the move suggestion
-        stockfish_text = "Stockfish suggestion: {}".format(suggested_move)
+    if board_renderer.panel_changed((turn_text, suggested_move, chatGPT_text)):
+        # Clear the side panel
+        panel = pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, 0, SCREEN_WIDTH - (2 * BOARD_OFFSET + 8 * SQUARE_SIZE), SCREEN_HEIGHT)
+        scrn.fill(BACKGROUND, panel)
+        dirty.append(panel)
 
-        drawText(scrn, stockfish_text, BLACK,
-                 pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2) + BOARD_OFFSET,
+        drawText(scrn, turn_text, BLACK,
+                 pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2),
                              math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 9)),
                  font, True, None)
 
-        # Text object for the move commentary
-        intro_text = "ChatGPT's commentary:"
+        if suggested_move != None and chatGPT_text != None:
+            # Human player's turn
+            # Text object for the move suggestion
+            stockfish_text = "Stockfish suggestion: {}".format(suggested_move)
 
-        drawText(scrn, intro_text, BLACK,
-                 pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2) + BOARD_OFFSET * 2,
-                             math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 9)),
-                 font, True, None)
+            drawText(scrn, stockfish_text, BLACK,
+                     pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2) + BOARD_OFFSET,
+                                 math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 9)),
+                     font, True, None)
 
-        chatGPT_text = "{}".format(chatGPT_text)
+            # Text object for the move commentary
+            intro_text = "ChatGPT's commentary:"
 
-        drawText(scrn, chatGPT_text, BLACK,
-                 pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2) + BOARD_OFFSET * 3,
-                             math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 9 * 6)),
-                 font, True, None)
+            drawText(scrn, intro_text, BLACK,
+                     pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2) + BOARD_OFFSET * 2,
+                                 math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 9)),
+                     font, True, None)
 
-    else:
-        # Opponent's turn
-        sleep_text = "Opponent is thinking..."
+            chatGPT_text = "{}".format(chatGPT_text)
 
-        drawText(scrn, sleep_text, BLACK,
-                 pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2) + BOARD_OFFSET,
-                             math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 18)),
-                 font, True, None)
+            commentary_panel.draw(scrn, chatGPT_text, font)
 
-    pygame.display.flip()
+        else:
+            # Opponent's turn
+            commentary_panel.draw(scrn, None, font)
+            sleep_text = "Opponent is thinking..."
+
+            drawText(scrn, sleep_text, BLACK,
+                     pygame.Rect(2 * BOARD_OFFSET + 8 * SQUARE_SIZE, int(BOARD_OFFSET / 2) + BOARD_OFFSET,
+                                 math.floor(SCREEN_WIDTH * 5 / 14), math.floor(SCREEN_HEIGHT / 18)),
+                     font, True, None)
+
+    pygame.display.update(dirty)
 
 
 # Players
@@ -279,35 +326,70 @@ class StockfishPlayer():
     Player using the Stockfish engine for move generation.
     Used for the medium opponent, hard opponent, and AI tutor.
     """
-    def __init__(self, path, color = True, time_limit = 1.0, depth = 16):
+    def __init__(self, path, color = True, time_limit = 1.0, depth = 16, book = None, pool = None, threads = None,
+                 hash_size = None, skill = None, analysis_cache = None):
         """
         Initialize player.
 
         Parameters
         ----------
         path : str
-            Path to the Stockfish engine.
+            Path to the Stockfish engine. Only used if pool is None.
         color : bool, default=True
             True if playing as white, False if playing as black.
         time_limit : float, default=1.0
             Time limit for Stockfish to search for a move suggestion.
         depth : int, default=16
             The maximum search depth for Stockfish.
+        book : OpeningBook, default=None
+            Opening book consulted before Stockfish. If None, Stockfish is used for every move.
+        pool : EnginePool, default=None
+            Pool of Stockfish engines shared with other players and games. If None, the player uses a pool of its own.
+        threads : int, default=None
+            Number of Stockfish search threads. If None, the engine's default is used.
+        hash_size : int, default=None
+            Size of the Stockfish hash table in MB. If None, the engine's default is used.
+        skill : int, default=None
+            Stockfish skill level from 0 to 20. If None, Stockfish plays at full strength.
+        analysis_cache : AnalysisCache, default=None
+            Cache of earlier analyses consulted before Stockfish and updated with its results.
+            If None, every board state is analysed.
         """
         self.color = color
-        self.engine = chess.engine.SimpleEngine.popen_uci(path)
-        self.limit = chess.engine.Limit(time = time_limit, depth = depth)
+        self.book = book
+        self.analysis_cache = analysis_cache
+        self.own_pool = pool is None
+        self.pool = EnginePool(path, max_idle = 1) if pool is None else pool
+        # Search limit and engine options of each request to the pool
+        self.lease_options = {"time_limit": time_limit, "depth": depth, "threads": threads, "hash_size": hash_size,
+                              "skill": skill}
+        # Time in seconds an opponent takes for each move, including the search
+        self.thinking_time = 10.0
+
+        # Background analysis of the board state expected next, the engine lease it runs on and that board state's key
+        self.ponder_analysis = None
+        self.ponder_lease = None
+        self.ponder_key = None
+        # Expected reply to the last move, from the engine's principal variation
+        self.predicted_move = None
+        # Score and principal variation behind the last move, None if it came from the opening book
+        self.analysis = None
+        # Held while the player searches or ponders, since a stale suggestion of the tutor can still be running
+        # when pondering starts on another worker thread
+        self.lock = threading.RLock()
 
     def get_move(self, board, sleep = True):
         """
         Get the best move for a board state.
+        The opening book and the analysis cache are consulted first. If the board state was pondered on,
+        the result of the background analysis is used.
 
         Parameters
         ----------
         board : chess.Board
             Chess board representing the current board state.
         sleep : bool, default=True
-            True if the player is an opponent - makes the player pause before generating a move.
+            True if the player is an opponent - makes the player pause for the rest of the thinking time.
             False if the player is not an opponent and is the tutor for the human player.
 
         Returns
@@ -315,24 +397,182 @@ class StockfishPlayer():
         chess.Move
             Best move for a board state.
         """
+        start = time.perf_counter()
+        with self.lock:
+            self.predicted_move = None
+            self.analysis = None
+            move = None
+            if self.book is not None:
+                move = self.book.get_move(board)
+            if move is None:
+                move = self.cached_move(board)
+            if move is not None:
+                self.stop_pondering()
+            else:
+                move = self.ponder_move(board)
+            if move is None:
+                # The player is passed as the game, so that a shared engine starts a new game when it changes hands
+                lease = self.pool.acquire(**self.lease_options)
+                try:
+                    result = lease.engine.play(board, lease.limit, game = self, info = chess.engine.INFO_SCORE | chess.engine.INFO_PV)
+                finally:
+                    self.pool.release(lease)
+                move, self.predicted_move = result.move, result.ponder
+                self.store_analysis(board, move, result.info)
+
         if sleep:
-            # Pause for 10 seconds
-            time.sleep(10)
-        result = self.engine.play(board, self.limit)
-        return result.move
+            # Pause for the rest of the thinking time
+            time.sleep(max(0, self.thinking_time - (time.perf_counter() - start)))
+        return move
+
+    def ponder(self, board):
+        """
+        Start analysing a board state in the background, so that get_move() for it returns without searching.
+        The analysis stops by itself at the player's search limit. Nothing is started if the player is still
+        searching or no pooled engine is idle, so that the caller never waits.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the board state expected next.
+        """
+        if not self.lock.acquire(blocking = False):
+            return
+        try:
+            self.stop_pondering()
+            if self.analysis_cache is not None and self.analysis_cache.get(self.analysis_key(board)) is not None:
+                # Already analysed
+                return
+            lease = self.pool.acquire(**self.lease_options, wait = False)
+            if lease is None:
+                return
+            self.ponder_lease = lease
+            self.ponder_key = position_key(board)
+            self.ponder_analysis = lease.engine.analysis(board, lease.limit, game = self)
+        finally:
+            self.lock.release()
+
+    def ponder_move(self, board):
+        """
+        Get the best move found by pondering on a board state, and stop pondering.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+
+        Returns
+        -------
+        chess.Move or None
+            Best move found by pondering, or None if a different board state was pondered on.
+        """
+        analysis = self.ponder_analysis
+        if analysis is None or self.ponder_key != position_key(board):
+            self.stop_pondering()
+            return None
+
+        # Wait for the analysis to reach the search limit if the board state came up early
+        best = analysis.wait()
+        self.pool.release(self.ponder_lease)
+        self.ponder_analysis, self.ponder_lease, self.ponder_key = None, None, None
+        self.predicted_move = best.ponder
+        if best.move is not None:
+            self.store_analysis(board, best.move, analysis.info)
+        return best.move
+
+    def analysis_key(self, board):
+        """
+        Get the analysis cache key of a board state with this player's search limits.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the board state.
+
+        Returns
+        -------
+        str
+            The analysis cache key.
+        """
+        options = self.lease_options
+        return analysis_key(board, options["depth"], options["time_limit"], options["skill"])
+
+    def cached_move(self, board):
+        """
+        Get the best move of a board state from the analysis cache.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+
+        Returns
+        -------
+        chess.Move or None
+            Cached best move, or None if there is no cache or the board state is not in it.
+        """
+        if self.analysis_cache is None:
+            return None
+        entry = self.analysis_cache.get(self.analysis_key(board))
+        if entry is None:
+            return None
+
+        move, score, pv = entry
+        self.analysis = (score, pv)
+        if len(pv) > 1:
+            self.predicted_move = Move.from_uci(pv[1])
+        return Move.from_uci(move)
+
+    def store_analysis(self, board, move, info):
+        """
+        Keep Stockfish's analysis of a board state as the analysis of the last move,
+        and store it in the analysis cache if there is one.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the analysed board state.
+        move : chess.Move
+            Best move found.
+        info : dict
+            Information sent by Stockfish, with the score and principal variation if available.
+        """
+        score = info.get("score")
+        if score is not None:
+            score = score.white().score(mate_score = 100000)
+        pv = tuple(pv_move.uci() for pv_move in info.get("pv", [move]))
+        self.analysis = (score, pv)
+        if self.analysis_cache is None:
+            return
+        self.analysis_cache.put(self.analysis_key(board), move.uci(), score, pv)
+
+    def stop_pondering(self):
+        """
+        Stop the background analysis and return its engine to the pool, if there is one.
+        """
+        with self.lock:
+            if self.ponder_analysis is not None:
+                self.ponder_analysis.stop()
+                self.ponder_analysis.wait()
+                self.pool.release(self.ponder_lease)
+                self.ponder_analysis, self.ponder_lease, self.ponder_key = None, None, None
 
     def close_engine(self):
         """
-        Closes the Stockfish engine. Necessary for a clean exit from the game window.
+        Stops pondering and closes the Stockfish engine if the player has its own pool.
+        A shared pool is left running for the next game. Necessary for a clean exit from the game window.
         """
-        self.engine.quit()
+        self.stop_pondering()
+        if self.own_pool:
+            self.pool.close()
 
 class ABPlayer():
     """
     Player using alpha-beta pruning for move generation.
     Used for the easy opponent.
     """
-    def __init__(self, color = True, fail_hard = True, depth = 3):
+    def __init__(self, color = True, fail_hard = True, time_limit = 7.0, node_limit = None, max_depth = 3, tt_size = 2 ** 18,
+                 quiescence = True, workers = 1, eval_cache_bytes = None, negamax = False, on_iteration = None, book = None):
         """
         Initialize player.
 
@@ -342,14 +582,64 @@ class ABPlayer():
             True if playing as white, False if playing as black.
         fail_hard : bool, default=True
             True to use the fail-hard version of alpha-beta pruning, False to use the fail-soft version.
-        depth : int, default=3
+        time_limit : float, default=7.0
+            Time in seconds the player takes for each move. The search stops when it runs out,
+            and the player pauses for the rest of it if the search finishes early.
+        node_limit : int, default=None
+            Number of searched nodes after which the search is stopped. If None, there is no node limit.
+        max_depth : int, default=3
             The maximum search depth for alpha-beta pruning.
+        tt_size : int, default=2**18
+            Number of slots in the transposition table. The table is kept for the whole game.
+        quiescence : bool, default=True
+            True to extend the search at the leaves with a capture-only quiescence search.
+        workers : int, default=1
+            Number of worker processes to split the root moves over. If 1, the search runs in this process
+            and its result is deterministic. The node limit does not apply to the parallel search.
+        eval_cache_bytes : int, default=None
+            Memory budget in bytes of an evaluation cache kept for the whole game, used instead of
+            incremental evaluation. If None, leaves are evaluated incrementally.
+        negamax : bool, default=False
+            True to use negamax with principal variation search, aspiration windows, null-move pruning and
+            late move reductions instead of the version set by fail_hard. Only used when workers is 1.
+        on_iteration : callable, default=None
+            Called with the SearchStats after each completed iteration of every search.
+        book : OpeningBook, default=None
+            Opening book consulted before searching. If None, every move is searched.
         """
+        # The search is imported here, so that games without this player start without loading it
+        from src.search import SearchStats
+        from src.ordering import MoveOrderer
+        from src.evaluation import EvaluationCache
+        from src.transposition import TranspositionTable
+
         self.color = color
         self.fail_hard = fail_hard
-        self.depth = depth
-
-    def get_move(self, board):
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.tt = TranspositionTable(tt_size)
+        self.orderer = MoveOrderer()
+        self.quiescence = quiescence
+        self.workers = workers
+        self.parallel = None
+        self.eval_cache = None if eval_cache_bytes is None else EvaluationCache(eval_cache_bytes)
+        self.negamax = negamax
+        self.on_iteration = on_iteration
+        self.book = book
+
+        # Statistics of the last search
+        self.stats = SearchStats()
+
+        # Background search of the board state expected next, and the event that stops it
+        self.ponder_thread = None
+        self.ponder_stop = None
+        # Expected reply to the last move, from the principal variation
+        self.predicted_move = None
+        # Held while the player searches or starts or stops pondering, which run in different worker threads
+        self.lock = threading.RLock()
+
+    def get_move(self, board, return_stats = False, sleep = True):
         """
         Get the suggested move for a board state.
 
@@ -357,19 +647,77 @@ class ABPlayer():
         ----------
         board : chess.Board
             Chess board representing the current board state.
+        return_stats : bool, default=False
+            True to also return the statistics of the search.
+        sleep : bool, default=True
+            True to pause for the rest of the time limit if the search finishes early.
 
         Returns
         -------
         chess.Move
             Suggested move for a board state.
+        SearchStats
+            Statistics of the search, only returned if return_stats is True.
+        """
+        start = time.perf_counter()
+        with self.lock:
+            move = self.search(board)
+
+        if sleep:
+            # Pause for the rest of the time limit
+            time.sleep(max(0, self.time_limit - (time.perf_counter() - start)))
+
+        if return_stats:
+            return move, self.stats
+        return move
+
+    def search(self, board):
         """
-        # Pause for 7 seconds
-        time.sleep(7)
+        Search for the suggested move for a board state within the time and node limits.
 
-        if self.fail_hard:
-            moves, _ = alpha_beta_fail_hard(board, self.depth, board.turn)
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+
+        Returns
+        -------
+        chess.Move
+            Suggested move for a board state.
+        """
+        from src.search import iterative_deepening, SearchStats
+        from src.parallel import ParallelSearch
+
+        self.stop_pondering()
+        self.predicted_move = None
+
+        # Play from the opening book without searching
+        if self.book is not None:
+            move = self.book.get_move(board)
+            if move is not None:
+                self.stats = SearchStats()
+                return move
+
+        # Reuse the result from an earlier turn or from pondering if this board state was already searched deep enough
+        entry = self.tt.probe(position_key(board))
+        if entry is not None and entry[1] >= self.max_depth and entry[2] == EXACT and entry[4] in board.legal_moves:
+            self.stats = SearchStats()
+            return entry[4]
+
+        if self.workers > 1:
+            # Start the worker processes on the first move
+            if self.parallel is None:
+                self.parallel = ParallelSearch(self.workers, fail_hard = self.fail_hard, quiescence = self.quiescence)
+            moves, _, _, self.stats = self.parallel.search(board, self.max_depth, time_limit = self.time_limit,
+                                                           callback = self.on_iteration)
         else:
-            moves, _ = alpha_beta_fail_soft(board, self.depth, board.turn)
+            self.tt.new_search()
+            self.orderer.new_search()
+            moves, _, _, self.stats = iterative_deepening(board, self.max_depth, time_limit = self.time_limit, node_limit = self.node_limit,
+                                                          fail_hard = self.fail_hard, tt = self.tt, orderer = self.orderer,
+                                                          quiescence = self.quiescence, incremental = self.eval_cache is None,
+                                                          eval_cache = self.eval_cache, negamax = self.negamax,
+                                                          callback = self.on_iteration)
 
         # Make sure move is legal
         current_move = ""
@@ -379,28 +727,86 @@ class ABPlayer():
                 break
         if current_move == "":
             current_move = moves[0]
+        if current_move == moves[0] and len(moves) > 1:
+            self.predicted_move = Move.from_uci(moves[1])
 
         return Move.from_uci(current_move)
 
+    def ponder(self, board):
+        """
+        Start searching a board state in a background thread. The search fills the transposition table,
+        so that search() for the board state returns from the table if it reaches the maximum depth.
+        Only used when workers is 1, since worker processes keep their own tables.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the board state expected next.
+        """
+        from src.search import iterative_deepening
+
+        with self.lock:
+            self.stop_pondering()
+            if self.workers > 1:
+                return
+
+            self.tt.new_search()
+            self.orderer.new_search()
+            self.ponder_stop = threading.Event()
+            kwargs = {"fail_hard": self.fail_hard, "tt": self.tt, "orderer": self.orderer, "quiescence": self.quiescence,
+                      "incremental": self.eval_cache is None, "eval_cache": self.eval_cache, "negamax": self.negamax,
+                      "stop_event": self.ponder_stop}
+            self.ponder_thread = threading.Thread(target = iterative_deepening, args = (board.copy(), self.max_depth),
+                                                  kwargs = kwargs, daemon = True)
+            self.ponder_thread.start()
+
+    def stop_pondering(self):
+        """
+        Stop the background search and wait for it to return, if there is one.
+        """
+        with self.lock:
+            if self.ponder_thread is not None:
+                self.ponder_stop.set()
+                self.ponder_thread.join()
+                self.ponder_thread, self.ponder_stop = None, None
+
+    def close(self):
+        """
+        Stops pondering and shuts down the worker processes of the parallel search, if any were started.
+        """
+        self.stop_pondering()
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+
 # Human player has no get_move() method since this is handled by the GUI in play_game()
 class HumanPlayer():
     """
     Human player.
     """
-    def __init__(self, path, color = True):
+    def __init__(self, path, color = True, book = None, pool = None, analysis_cache = None, commentary_cache = None):
         """
         Initialize player.
 
         Parameters
         ----------
         path : str
-            Path to the Stockfish engine.
+            Path to the Stockfish engine. Only used if pool is None.
         color : bool, default=True
             True if playing as white, False if playing as black.
+        book : OpeningBook, default=None
+            Opening book consulted by the tutor before Stockfish.
+        pool : EnginePool, default=None
+            Pool of Stockfish engines shared with other players and games. If None, the tutor uses a pool of its own.
+        analysis_cache : AnalysisCache, default=None
+            Cache of earlier analyses consulted by the tutor before Stockfish.
+        commentary_cache : CommentaryCache, default=None
+            Cache of earlier ChatGPT commentary on the tutor's suggestions.
         """
         self.color = color
+        self.commentary_cache = commentary_cache
         # AI tutor
-        self.tutor = StockfishPlayer(path, color = color)
+        self.tutor = StockfishPlayer(path, color = color, book = book, pool = pool, analysis_cache = analysis_cache)
 
 
 # Gameplay
@@ -426,54 +832,250 @@ def who(player):
         return "BLACK"
     return None
 
-def get_ChatGPT_response(current_move, is_white, current_board_string):
+# Commentary shown instead of an invalid explanation
+INVALID_COMMENTARY = "Sorry, I'm having a hard time understanding this move and board."
+
+# Client for ChatGPT requests, shared by all players. Created with the OpenAI backend on first use if not set
+llm_client = None
+
+def get_llm_client():
+    """
+    Get the client for ChatGPT requests, creating it if it was not set.
+
+    Returns
+    -------
+    LLMClient
+        The shared client.
+    """
+    global llm_client
+    if llm_client is None:
+        llm_client = LLMClient(OpenAIBackend())
+    return llm_client
+
+def get_ChatGPT_response(board, move, score = None, pv = None, on_text = None):
     """
     Get move commentary from ChatGPT.
 
     Parameters
     ----------
-    current_move : str
+    board : chess.Board
+        Chess board representing the board state the move is suggested in.
+    move : chess.Move
         The move suggested by Stockfish for the human player.
-    is_white : bool
-        True if the human player is playing as white, False if playing as black.
-    current_board_string : str
-        ASCII representation of the board state.
+    score : int, default=None
+        Stockfish's score of the board state in centipawns from white's point of view. If None, it is not sent.
+    pv : tuple of str, default=None
+        Stockfish's principal variation in UCI format, starting with the suggested move. If None, it is not sent.
+    on_text : callable, default=None
+        If given, the response is streamed and this is called with the response so far as each part arrives.
+        The returned commentary can still differ from the streamed text if it is filtered as invalid.
 
     Returns
     -------
     str
         Commentary on the given move.
-    """
-    system_message = "You will comment on the current state of this chess game described in an ASCII format. Answer as concisely as possible."
-    board_state_message = "This is the current chess board state in ASCII format:"
-
-    current_color = who(is_white).lower()
-    comment_message = "Please comment on the quality of move {} for {}".format(current_move, current_color)
 
+    Raises
+    ------
+    LLMError
+        If ChatGPT could not be reached after retrying.
+    """
     # Prompt ChatGPT
-    response = openai.ChatCompletion.create(
-        model = 'gpt-3.5-turbo',
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": board_state_message},
-            {"role": "user", "content": current_board_string},
-            {"role": "user", "content": comment_message},
-        ],
-        max_tokens = 100
-    )
-    # Get ChatGPT response
-    message = response.choices[0]['message']
-    response_string = "{}".format(message['content'])
+    messages = build_prompt(board, move, score, pv)
+    response_string = get_llm_client().complete(messages, max_tokens = 100, on_text = on_text)
 
     # Filter for invalid explanation
     if "not possible" in response_string or "illegal" in response_string or "not legal" in response_string or "not valid" in response_string or "invalid" in response_string:
-        response_string = "Sorry, I'm having a hard time understanding this move and board."
+        response_string = INVALID_COMMENTARY
 
     return response_string
 
+# Event type of worker thread results, see start_task()
+RESULT_EVENT = pygame.event.custom_type()
+
+def post_result(name, ply, result):
+    """
+    Deliver a worker thread result to the game loop as a RESULT_EVENT, waking it up if it is waiting for events.
+    Can be called from any thread. The result is dropped if the game window was closed.
+
+    Parameters
+    ----------
+    name : str
+        Name of the result, e.g. "suggestion" or "opponent".
+    ply : int
+        Number of moves played when the work was started, to recognise results of earlier turns.
+    result : object
+        The result.
+    """
+    try:
+        pygame.event.post(pygame.event.Event(RESULT_EVENT, name = name, ply = ply, result = result))
+    except pygame.error:
+        pass
+
+def start_task(name, ply, function, *args):
+    """
+    Run a function in a worker thread and post its result with post_result(), so that the game loop is not blocked.
+
+    Parameters
+    ----------
+    name : str
+        Name of the task, e.g. "suggestion" or "opponent".
+    ply : int
+        Number of moves played when the task was started, to recognise results of earlier turns.
+    function : callable
+        The function to run. If it raises, the exception is the result.
+    *args
+        Arguments of the function.
+    """
+    def run():
+        try:
+            result = function(*args)
+        except Exception as e:
+            result = e
+        post_result(name, ply, result)
+
+    threading.Thread(target = run, daemon = True).start()
+
+def tutor_commentary(move, board, commentary_cache = None, on_text = None, analysis = None):
+    """
+    Get ChatGPT's commentary on the tutor's move suggestion, from the commentary cache if it was explained before.
+    Runs in a worker thread.
+
+    Parameters
+    ----------
+    move : chess.Move
+        The move suggested by the tutor.
+    board : chess.Board
+        Copy of the chess board representing the board state the move is suggested in.
+    commentary_cache : CommentaryCache, default=None
+        Cache of earlier commentary to consult and update. If None, ChatGPT is always asked.
+    on_text : callable, default=None
+        If given, ChatGPT's response is streamed and this is called with the response so far as each part arrives.
+    analysis : tuple, default=None
+        Stockfish's score and principal variation of the board state, sent along with the move. If None, only
+        the board state and move are sent.
+
+    Returns
+    -------
+    str
+        Commentary on the suggested move, or a notice if ChatGPT could not be reached.
+    """
+    key = None
+    if commentary_cache is not None:
+        key = commentary_key(board, move, PROMPT_VERSION)
+        text = commentary_cache.get(key)
+        if text is not None:
+            return text
+
+    try:
+        score, pv = analysis if analysis is not None else (None, None)
+        text = get_ChatGPT_response(board, move, score, pv, on_text)
+    except:
+        # The client already retried with backoff
+        return "ChatGPT has received too many requests. Commentary will resume in a couple moves."
+
+    # Invalid explanations are not cached, so that ChatGPT is asked again next time
+    if key is not None and text != INVALID_COMMENTARY:
+        try:
+            commentary_cache.put(key, text)
+        except Exception:
+            # The commentary is still shown if it cannot be cached
+            pass
+    return text
+
+def opponent_turn(player, board, tutor = None):
+    """
+    Get the opponent's move, then start the tutor on the board state after it. Runs in a worker thread.
+
+    Parameters
+    ----------
+    player : StockfishPlayer or ABPlayer
+        The opponent.
+    board : chess.Board
+        Copy of the chess board representing the current board state.
+    tutor : StockfishPlayer, default=None
+        The human player's tutor, which ponders while the opponent's thinking time runs out. If None, nobody ponders.
+
+    Returns
+    -------
+    chess.Move or None
+        The opponent's move, or None if the opponent resigns.
+    """
+    move = player.get_move(board, sleep = False)
+    if move is not None and tutor is not None:
+        board.push(move)
+        tutor.ponder(board)
+    return move
+
+def close_players(white_player, black_player):
+    """
+    Close all instances of the Stockfish engine and shut down alpha-beta worker processes.
+
+    Parameters
+    ----------
+    white_player : StockfishPlayer, ABPlayer, or HumanPlayer
+        The white player.
+    black_player : StockfishPlayer, ABPlayer, or HumanPlayer
+        The black player.
+    """
+    for player in [white_player, black_player]:
+        if isinstance(player, HumanPlayer):
+            player.tutor.close_engine()
+        elif isinstance(player, StockfishPlayer):
+            player.close_engine()
+        elif isinstance(player, ABPlayer):
+            player.close()
+
+class LoopStats():
+    """
+    Statistics of the game loop, to confirm that it sleeps instead of using the CPU while nothing happens.
+    """
+    def __init__(self):
+        """
+        Initialize statistics, starting the time and CPU time measurement.
+        Must be created on the thread that runs the game loop.
+        """
+        # Number of loop iterations and time in seconds spent waiting for events
+        self.frames = 0
+        self.waited = 0.0
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+    def seconds(self):
+        """
+        Get the time since the game loop started.
+
+        Returns
+        -------
+        float
+            Time in seconds.
+        """
+        return time.perf_counter() - self.start
+
+    def cpu_percent(self):
+        """
+        Get the CPU use of the game loop thread, excluding worker threads. Must be called on the thread
+        that runs the game loop.
+
+        Returns
+        -------
+        float
+            CPU time as a percentage of the time since the game loop started.
+        """
+        seconds = self.seconds()
+        return 100 * (time.thread_time() - self.cpu_start) / seconds if seconds > 0 else 0.0
+
+    def __str__(self):
+        seconds = self.seconds()
+        return "Game loop: {} frames in {:.1f} s, {:.1f}% of the time waiting for events, {:.1f}% CPU".format(
+            self.frames, seconds, 100 * self.waited / seconds if seconds > 0 else 0.0, self.cpu_percent())
+
 def play_game(white_player, black_player, human_black, board = None):
     """
     Play full chess game.
+    Engine, search and ChatGPT calls run in worker threads, so that the game window keeps repainting
+    and handling input while they run. The game loop sleeps until input, a worker thread result or the
+    opponent's move is due, and handles them at most FRAME_RATE times per second.
 
     Parameters
     ----------
@@ -489,6 +1091,9 @@ def play_game(white_player, black_player, human_black, board = None):
     """
     global SCREEN_WIDTH, SCREEN_HEIGHT, SQUARE_SIZE, BOARD_OFFSET, scrn, pieces
 
+    if scrn is None:
+        init_display()
+
     if board == None:
         # Generate new board to play on
         board = chess.Board()
@@ -496,9 +1101,6 @@ def play_game(white_player, black_player, human_black, board = None):
 
     resign = False
 
-    # Name the game window
-    pygame.display.set_caption('Chess')
-
     # Variables for updating display
     index_moves = []
     if human_black:
@@ -508,144 +1110,203 @@ def play_game(white_player, black_player, human_black, board = None):
         suggested_move = ""
         chatGPT_text = ""
     highlight_squares = []
+    # True if the highlighted squares show the latest move, False if they show the moves of a clicked piece
+    latest_move = False
     update(scrn, board, suggested_move, chatGPT_text, human_black)
 
+    # Number of moves played when the current turn's task was started
+    task_ply = None
+    # Opponent's move, shown once its thinking time has passed
+    opponent_move = None
+    move_due = None
+    clock = pygame.time.Clock()
+    loop_stats = LoopStats()
+
     while not board.is_game_over(claim_draw=True):
 
         if board.turn == white_player.color:
-            current_player = white_player
+            current_player, other_player = white_player, black_player
         else:
-            current_player = black_player
-
-        if isinstance(current_player, HumanPlayer):
-            # Human player's turn, get tutor move suggestion and commentary
-            move = current_player.tutor.get_move(board, sleep = False)
-            try:
-                chatGPT_text = get_ChatGPT_response(move, board.turn, str(board))
-            except:
-                chatGPT_text = "ChatGPT has received too many requests. Commentary will resume in a couple moves."
-            suggested_move = "{}".format(move)
-
-            update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares, latest_move=True)
+            current_player, other_player = black_player, white_player
+        ply = len(board.move_stack)
+
+        # Start the work of a new turn in a worker thread
+        if task_ply != ply:
+            task_ply = ply
+            if isinstance(current_player, HumanPlayer):
+                # Human player's turn, get tutor move suggestion, then commentary on it
+                # The tutor has usually already analysed this board state while the opponent paused
+                start_task("suggestion", ply, current_player.tutor.get_move, board.copy(), False)
+            else:
+                # Opponent's turn, the move is shown after the opponent's thinking time
+                if isinstance(current_player, StockfishPlayer):
+                    thinking_time = current_player.thinking_time
+                else:
+                    thinking_time = current_player.time_limit
+                move_due = time.perf_counter() + thinking_time
+                tutor = other_player.tutor if isinstance(other_player, HumanPlayer) else None
+                start_task("opponent", ply, opponent_turn, current_player, board.copy(), tutor)
+
+        move = None
+        commentary_changed = False
+
+        # Sleep until an event arrives or the opponent's move is due
+        if opponent_move is not None:
+            timeout = min(MAX_WAIT, max(1, math.ceil((move_due - time.perf_counter()) * 1000)))
+        else:
+            timeout = MAX_WAIT
+        wait_start = time.perf_counter()
+        events = [pygame.event.wait(timeout)] + pygame.event.get()
+        loop_stats.waited += time.perf_counter() - wait_start
+        loop_stats.frames += 1
+
+        # Handle results of worker threads, dropping those of earlier turns
+        for event in events:
+            if event.type != RESULT_EVENT or event.ply != ply:
+                continue
+            name, result = event.name, event.result
+            if isinstance(result, Exception):
+                raise result
+
+            if name == "suggestion":
+                # Show the suggestion right away and fetch the commentary while the human player thinks
+                suggested_move = "{}".format(result)
+                chatGPT_text = COMMENTARY_PLACEHOLDER
+                # Streamed parts of the commentary are posted as they arrive
+                on_text = lambda text, ply = ply: post_result("partial commentary", ply, text)
+                start_task("commentary", ply, tutor_commentary, result, board.copy(),
+                           current_player.commentary_cache, on_text, current_player.tutor.analysis)
+                update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares, latest_move)
+
+                # Let the opponent ponder on its predicted reply of the human player, started in a worker thread
+                # since it waits for the engine. This starts after the tutor is done, so that both can share one
+                # pooled engine
+                if not isinstance(other_player, HumanPlayer) and other_player.predicted_move is not None \
+                        and other_player.predicted_move in board.legal_moves:
+                    ponder_board = board.copy()
+                    ponder_board.push(other_player.predicted_move)
+                    start_task("ponder", ply, other_player.ponder, ponder_board)
+            elif name == "commentary" or name == "partial commentary":
+                chatGPT_text = result
+                commentary_changed = True
+            elif name == "ponder":
+                # Pondering started, nothing to show
+                pass
+            else:
+                opponent_move = result
+                if opponent_move == None:
+                    resign = True
 
-            move = None
+        if resign:
+            break
 
-            while move is None:
-                # Get human player's choice move from the game window
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        # Quit the program and pygame
-                        pygame.quit()
-                        if isinstance(white_player, HumanPlayer):
-                            white_player.tutor.close_engine()
-                        if isinstance(black_player, HumanPlayer):
-                            black_player.tutor.close_engine()
-                        if isinstance(white_player, StockfishPlayer):
-                            white_player.close_engine()
-                        if isinstance(black_player, StockfishPlayer):
-                            black_player.close_engine()
-                        sys.exit(0)
-
-                    elif event.type == pygame.VIDEORESIZE:
-                        # Resize window
-                        # Adjust screen and board display variables accordingly
-                        SQUARE_SIZE = SQUARE_SIZE * event.dict['size'][1] / SCREEN_HEIGHT
-                        BOARD_OFFSET = SQUARE_SIZE / 2
-                        SCREEN_WIDTH, SCREEN_HEIGHT = event.dict['size']
-                        # Adjust size of pieces and screen
-                        pieces = {k: pygame.transform.scale(v, (SQUARE_SIZE, SQUARE_SIZE)) for k, v in og_pieces.items()}
-                        scrn = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.HWSURFACE|pygame.DOUBLEBUF|pygame.RESIZABLE)
-                        update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares, latest_move=True)
-
-                    elif event.type == pygame.MOUSEBUTTONDOWN:
-                        # Mouse clicked
-                        # Get position of mouse
-                        pos = pygame.mouse.get_pos()
-
-                        # Find which square was clicked and its index
-                        if human_black:
-                            # Board display is from black's point of view
-                            # Get the square on the board from white's point of view
-                            square = (7 - math.floor((pos[0] - BOARD_OFFSET) / SQUARE_SIZE), 7 - math.floor((pos[1] - BOARD_OFFSET) / SQUARE_SIZE))
-                        else:
-                            square = (math.floor((pos[0] - BOARD_OFFSET) / SQUARE_SIZE), math.floor((pos[1] - BOARD_OFFSET) / SQUARE_SIZE))
-                        if square[0] < 0 or square[0] > 7 or square[1] < 0 or square[1] > 7:
-                            continue
-
-                        index = (7 - square[1]) * 8 + square[0]
-
-                        if index in index_moves: 
-                            # Moving a piece
-                            move = moves[index_moves.index(index)]
-
-                            #reset index and moves
-                            index = None
-                            index_moves = []
-
-                        else:
-                            # Show possible moves
-                            # Check the square that is clicked
-                            piece = board.piece_at(index)
-                            # If empty, pass
-                            if piece == None:
-                                pass
-                            else:
-                                # Figure out what moves this piece can make
-                                all_moves = list(board.legal_moves)
-                                moves = []
-                                highlight_squares = []
-                                for m in all_moves:
-                                    if m.from_square == index:
-                                        moves.append(m)
-                                        t = m.to_square
-                                        if human_black:
-                                            # Board display is from black's point of view
-                                            # Get the square on the board from white's point of view
-                                            t = 63 - t
-
-                                        # Highlight squares it can move to
-                                        highlight_squares.append(t)
-
-                                update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares)
-
-                                index_moves = [a.to_square for a in moves]
-
-            suggested_move = None
-            chatGPT_text = None
-
-            if move == None:
-                resign = True
-                break
-        else:
-            move = current_player.get_move(board)
-            if move == None:
-                resign = True
-                break
+        # Show the latest commentary, redrawing only the end of the panel while it is streamed in
+        if commentary_changed and not commentary_panel.extend(scrn, chatGPT_text):
+            update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares, latest_move)
 
+        # Play the opponent's move once its thinking time has passed
+        if opponent_move is not None and time.perf_counter() >= move_due:
+            move = opponent_move
+            opponent_move = None
             suggested_move = ""
             chatGPT_text = ""
 
-        game_moves.append(move.uci())
-        board.push(move)
-
-        square_num = move.to_square
-        if human_black:
-            square_num = 63 - square_num
-        highlight_squares = [square_num]
-
-        update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares, latest_move = True)
+        for event in events:
+            if event.type == pygame.QUIT:
+                # Quit the program and pygame
+                pygame.quit()
+                close_players(white_player, black_player)
+                print(loop_stats)
+                sys.exit(0)
+
+            elif event.type == pygame.VIDEORESIZE:
+                # Resize window
+                # Adjust screen and board display variables accordingly
+                SQUARE_SIZE = SQUARE_SIZE * event.dict['size'][1] / SCREEN_HEIGHT
+                BOARD_OFFSET = SQUARE_SIZE / 2
+                SCREEN_WIDTH, SCREEN_HEIGHT = event.dict['size']
+                # Adjust size of pieces and screen
+                pieces = {k: pygame.transform.scale(v, (SQUARE_SIZE, SQUARE_SIZE)) for k, v in og_pieces.items()}
+                scrn = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.HWSURFACE|pygame.DOUBLEBUF|pygame.RESIZABLE)
+                board_renderer.invalidate()
+                update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares, latest_move)
+
+            elif event.type == pygame.MOUSEBUTTONDOWN and isinstance(current_player, HumanPlayer) and move is None:
+                # Mouse clicked on the human player's turn
+                # Get position of mouse
+                pos = pygame.mouse.get_pos()
+
+                # Find which square was clicked and its index
+                if human_black:
+                    # Board display is from black's point of view
+                    # Get the square on the board from white's point of view
+                    square = (7 - math.floor((pos[0] - BOARD_OFFSET) / SQUARE_SIZE), 7 - math.floor((pos[1] - BOARD_OFFSET) / SQUARE_SIZE))
+                else:
+                    square = (math.floor((pos[0] - BOARD_OFFSET) / SQUARE_SIZE), math.floor((pos[1] - BOARD_OFFSET) / SQUARE_SIZE))
+                if square[0] < 0 or square[0] > 7 or square[1] < 0 or square[1] > 7:
+                    continue
+
+                index = (7 - square[1]) * 8 + square[0]
+
+                if index in index_moves: 
+                    # Moving a piece
+                    move = moves[index_moves.index(index)]
+
+                    #reset index and moves
+                    index = None
+                    index_moves = []
+
+                    suggested_move = None
+                    chatGPT_text = None
+
+                else:
+                    # Show possible moves
+                    # Check the square that is clicked
+                    piece = board.piece_at(index)
+                    # If empty, pass
+                    if piece == None:
+                        pass
+                    else:
+                        # Figure out what moves this piece can make
+                        all_moves = list(board.legal_moves)
+                        moves = []
+                        highlight_squares = []
+                        for m in all_moves:
+                            if m.from_square == index:
+                                moves.append(m)
+                                t = m.to_square
+                                if human_black:
+                                    # Board display is from black's point of view
+                                    # Get the square on the board from white's point of view
+                                    t = 63 - t
+
+                                # Highlight squares it can move to
+                                highlight_squares.append(t)
+
+                        latest_move = False
+                        update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares)
+
+                        index_moves = [a.to_square for a in moves]
+
+        if move is not None:
+            game_moves.append(move.uci())
+            board.push(move)
+
+            square_num = move.to_square
+            if human_black:
+                square_num = 63 - square_num
+            highlight_squares = [square_num]
+            latest_move = True
+
+            update(scrn, board, suggested_move, chatGPT_text, human_black, highlight_squares, latest_move)
+
+        # Wait for the next frame
+        clock.tick(FRAME_RATE)
 
     # Deactivate the pygame library
     pygame.quit()
-    # Close all instances of Stockfish engine
-    if isinstance(white_player, HumanPlayer):
-        white_player.tutor.close_engine()
-    if isinstance(black_player, HumanPlayer):
-        black_player.tutor.close_engine()
-    if isinstance(white_player, StockfishPlayer):
-        white_player.close_engine()
-    if isinstance(black_player, StockfishPlayer):
-        black_player.close_engine()
+    close_players(white_player, black_player)
+    print(loop_stats)
 
     # Print outcome and save game data to file
     outcome = board.outcome()
@@ -666,7 +1327,7 @@ def play_game(white_player, black_player, human_black, board = None):
     print(f"Outcome: {t}\nWinner: {w}\nNumber of moves: {len(game_moves)}")
     print("================================================================")
     print("Moves:\tWHITE\tBLACK\n        -------------")
-    for i in range(int(np.ceil(len(game_moves) / 2))):
+    for i in range(math.ceil(len(game_moves) / 2)):
         next_moves = game_moves[(i * 2):(i * 2 + 2)]
         if len(next_moves) == 1:
             print(f"{i + 1:>6}  {next_moves[0]}\n")
@@ -0,0 +1,377 @@
+from src.prompt import count_message_tokens, count_tokens
+from concurrent.futures import Future
+import json
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+# Reference: https://platform.openai.com/docs/guides/rate-limits
+
+class LLMError(Exception):
+    """
+    A failed LLM request.
+    """
+    def __init__(self, message, retryable = False, retry_after = None):
+        """
+        Initialize error.
+
+        Parameters
+        ----------
+        message : str
+            Description of the failure.
+        retryable : bool, default=False
+            True if the request can succeed when it is sent again, e.g. after a rate limit or timeout.
+        retry_after : float, default=None
+            Time in seconds the server asked to wait before retrying. If None, the client's backoff is used.
+        """
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class OpenAIBackend():
+    """
+    Chat completions through the openai package, which is imported on the first request since it is slow to import.
+    """
+    def __init__(self, model = "gpt-3.5-turbo", api_key = None):
+        """
+        Initialize backend.
+
+        Parameters
+        ----------
+        model : str, default="gpt-3.5-turbo"
+            Name of the chat model.
+        api_key : str, default=None
+            OpenAI API key. If None, the key is read from openai.api_key.
+        """
+        self.model = model
+        self.api_key = api_key
+
+    def complete(self, messages, max_tokens, timeout, on_text = None):
+        """
+        Send one chat completion request.
+
+        Parameters
+        ----------
+        messages : list of dict
+            Chat messages with "role" and "content".
+        max_tokens : int
+            Maximum number of tokens in the response.
+        timeout : float
+            Time in seconds after which the request fails.
+        on_text : callable, default=None
+            If given, the response is streamed and this is called with the response so far as each part arrives.
+
+        Returns
+        -------
+        str
+            The response.
+        dict or None
+            Token usage with "prompt_tokens" and "completion_tokens", or None if the server did not report it.
+            The client then counts the tokens itself.
+        """
+        import openai
+
+        if self.api_key is not None:
+            openai.api_key = self.api_key
+        try:
+            response = openai.ChatCompletion.create(model = self.model, messages = messages, max_tokens = max_tokens,
+                                                    request_timeout = timeout, stream = on_text is not None)
+            if on_text is None:
+                return "{}".format(response.choices[0]['message']['content']), response.get('usage')
+
+            text = ""
+            for chunk in response:
+                delta = chunk.choices[0]['delta']
+                if 'content' in delta:
+                    text += delta['content']
+                    on_text(text)
+            return text, None
+        except (openai.error.RateLimitError, openai.error.Timeout, openai.error.APIConnectionError,
+                openai.error.ServiceUnavailableError, openai.error.TryAgain, openai.error.APIError) as e:
+            retry_after = getattr(e, "headers", {}).get("retry-after")
+            raise LLMError(str(e), retryable = True, retry_after = float(retry_after) if retry_after else None)
+        except openai.error.OpenAIError as e:
+            raise LLMError(str(e))
+
+class HTTPBackend():
+    """
+    Chat completions from any server with an OpenAI-compatible /v1/chat/completions endpoint,
+    e.g. the local stand-in in src/mock_llm_server.py.
+    """
+    def __init__(self, url, model = "gpt-3.5-turbo", api_key = None):
+        """
+        Initialize backend.
+
+        Parameters
+        ----------
+        url : str
+            Base URL of the server, e.g. "http://127.0.0.1:8000".
+        model : str, default="gpt-3.5-turbo"
+            Name of the chat model.
+        api_key : str, default=None
+            Key sent as a bearer token. If None, no key is sent.
+        """
+        self.url = url.rstrip("/") + "/v1/chat/completions"
+        self.model = model
+        self.api_key = api_key
+
+    def complete(self, messages, max_tokens, timeout, on_text = None):
+        """
+        Send one chat completion request. See OpenAIBackend.complete().
+        """
+        body = {"model": self.model, "messages": messages, "max_tokens": max_tokens, "stream": on_text is not None}
+        headers = {"Content-Type": "application/json"}
+        if self.api_key is not None:
+            headers["Authorization"] = "Bearer {}".format(self.api_key)
+        request = urllib.request.Request(self.url, data = json.dumps(body).encode(), headers = headers)
+
+        try:
+            with urllib.request.urlopen(request, timeout = timeout) as response:
+                if on_text is None:
+                    result = json.load(response)
+                    return result["choices"][0]["message"]["content"], result.get("usage")
+
+                # Server-sent events, one JSON chunk per "data:" line
+                text = ""
+                for line in response:
+                    line = line.decode().strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0]["delta"]
+                    if "content" in delta:
+                        text += delta["content"]
+                        on_text(text)
+                return text, None
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get("Retry-After")
+            raise LLMError("HTTP {}".format(e.code), retryable = e.code == 429 or e.code >= 500,
+                           retry_after = float(retry_after) if retry_after else None)
+        except (urllib.error.URLError, socket.timeout, TimeoutError, ConnectionError) as e:
+            # Before Python 3.10, socket.timeout is not a subclass of TimeoutError
+            raise LLMError(str(e), retryable = True)
+
+class TokenBucket():
+    """
+    Rate limiter that lets requests through at a steady rate, with bursts up to the bucket's capacity.
+    """
+    def __init__(self, rate, capacity):
+        """
+        Initialize a full bucket.
+
+        Parameters
+        ----------
+        rate : float
+            Tokens added per second.
+        capacity : float
+            Maximum number of tokens in the bucket.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens = 1):
+        """
+        Take tokens from the bucket, waiting until enough have been added.
+
+        Parameters
+        ----------
+        tokens : float, default=1
+            Number of tokens to take.
+
+        Returns
+        -------
+        float
+            Time in seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+class LLMClient():
+    """
+    Chat completion client that rate-limits requests with a token bucket, retries failures with jittered
+    exponential backoff and sends identical concurrent requests only once. Keeps latency and usage metrics.
+    """
+    def __init__(self, backend, requests_per_minute = 60, burst = 5, timeout = 20.0, max_retries = 4,
+                 base_delay = 0.5, max_delay = 8.0):
+        """
+        Initialize client.
+
+        Parameters
+        ----------
+        backend : OpenAIBackend or HTTPBackend
+            The backend that sends requests.
+        requests_per_minute : float, default=60
+            Steady rate of requests the rate limiter lets through.
+        burst : int, default=5
+            Number of requests that can be sent at once after a quiet period.
+        timeout : float, default=20.0
+            Time in seconds after which a single attempt fails.
+        max_retries : int, default=4
+            Number of times a failed request is retried.
+        base_delay : float, default=0.5
+            Upper bound in seconds of the backoff before the first retry. It doubles with each retry.
+        max_delay : float, default=8.0
+            Maximum upper bound in seconds of the backoff.
+        """
+        self.backend = backend
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random = random.Random()
+
+        # Requests being sent, by request key, so that identical requests share one response
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.throttle_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = []
+
+    def complete(self, messages, max_tokens = 100, on_text = None):
+        """
+        Get a chat completion. An identical request that is already being sent is waited for instead of sent again.
+
+        Parameters
+        ----------
+        messages : list of dict
+            Chat messages with "role" and "content".
+        max_tokens : int, default=100
+            Maximum number of tokens in the response.
+        on_text : callable, default=None
+            If given, the response is streamed and this is called with the response so far as each part arrives.
+            A request that waits for an identical one gets a single call with the full response.
+
+        Returns
+        -------
+        str
+            The response.
+
+        Raises
+        ------
+        LLMError
+            If the request failed and could not be retried, or failed on every retry.
+        """
+        key = json.dumps([messages, max_tokens], sort_keys = True)
+        with self.lock:
+            self.requests += 1
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            text = future.result()
+            if on_text is not None:
+                on_text(text)
+            return text
+
+        try:
+            text = self.send(messages, max_tokens, on_text)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def send(self, messages, max_tokens, on_text):
+        """
+        Send a request through the rate limiter, retrying retryable failures with full-jitter exponential backoff.
+
+        Parameters
+        ----------
+        messages : list of dict
+            Chat messages with "role" and "content".
+        max_tokens : int
+            Maximum number of tokens in the response.
+        on_text : callable or None
+            Called with the response so far as each part arrives, or None to not stream.
+
+        Returns
+        -------
+        str
+            The response.
+        """
+        attempt = 0
+        while True:
+            self.throttle_seconds += self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                text, usage = self.backend.complete(messages, max_tokens, self.timeout, on_text)
+            except LLMError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                attempt += 1
+                self.retries += 1
+                time.sleep(delay)
+                continue
+
+            self.latencies.append(time.perf_counter() - start)
+            self.successes += 1
+            if usage is None:
+                # Streamed responses do not report usage
+                usage = {"prompt_tokens": count_message_tokens(messages), "completion_tokens": count_tokens(text)}
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            return text
+
+    def stats(self):
+        """
+        Get the client metrics.
+
+        Returns
+        -------
+        dict
+            Number of requests, successes, failures, retries and coalesced requests, time spent waiting
+            on the rate limiter, token usage, and mean, median and 95th percentile latency in seconds.
+        """
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "throttle_seconds": self.throttle_seconds,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_mean": sum(latencies) / len(latencies) if len(latencies) > 0 else 0.0,
+            "latency_p50": latencies[len(latencies) // 2] if len(latencies) > 0 else 0.0,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if len(latencies) > 0 else 0.0
+        }
@@ -0,0 +1,125 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import threading
+import time
+
+
+class MockLLMServer():
+    """
+    Local stand-in for the OpenAI chat completions endpoint, for testing the LLM client without network access.
+    Replies with fixed text after a delay and can answer the first requests with rate limit errors.
+    """
+    def __init__(self, port = 0, reply = "This move develops a piece and controls the center.", delay = 0.0,
+                 rate_limited = 0, retry_after = None):
+        """
+        Initialize server. It does not accept requests until start() is called.
+
+        Parameters
+        ----------
+        port : int, default=0
+            Port to listen on. If 0, a free port is chosen.
+        reply : str, default="This move develops a piece and controls the center."
+            Text of every response.
+        delay : float, default=0.0
+            Time in seconds before each response is sent.
+        rate_limited : int, default=0
+            Number of initial requests answered with HTTP 429.
+        retry_after : float, default=None
+            Value of the Retry-After header of rate limit errors. If None, the header is not sent.
+        """
+        self.reply = reply
+        self.delay = delay
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        Base URL of the server.
+        """
+        return "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def handler(self):
+        """
+        Get the request handler class, bound to this server's settings.
+
+        Returns
+        -------
+        type
+            Subclass of BaseHTTPRequestHandler.
+        """
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with mock.lock:
+                    mock.requests += 1
+                    limited = mock.requests <= mock.rate_limited
+                time.sleep(mock.delay)
+
+                if limited:
+                    self.send_response(429)
+                    if mock.retry_after is not None:
+                        self.send_header("Retry-After", str(mock.retry_after))
+                    self.end_headers()
+                    return
+
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    words = mock.reply.split(" ")
+                    for i, word in enumerate(words):
+                        chunk = {"choices": [{"delta": {"content": word if i == 0 else " " + word}}]}
+                        self.wfile.write("data: {}\n\n".format(json.dumps(chunk)).encode())
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    return
+
+                prompt_tokens = sum(len(message["content"].split()) for message in body["messages"])
+                result = json.dumps({
+                    "choices": [{"message": {"role": "assistant", "content": mock.reply}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(mock.reply.split())}
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(result)))
+                self.end_headers()
+                self.wfile.write(result)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """
+        Start accepting requests on a background thread.
+        """
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+
+    def close(self):
+        """
+        Stop the server.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Local stand-in for the OpenAI chat completions endpoint.")
+    parser.add_argument("--port", type = int, default = 8000, help = "Port to listen on")
+    parser.add_argument("--delay", type = float, default = 0.5, help = "Seconds before each response")
+    parser.add_argument("--rate-limited", type = int, default = 0, help = "Number of initial requests answered with HTTP 429")
+    args = parser.parse_args()
+
+    server = MockLLMServer(port = args.port, delay = args.delay, rate_limited = args.rate_limited)
+    print("Serving on {}".format(server.url))
+    server.server.serve_forever()
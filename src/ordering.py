@@ -0,0 +1,168 @@
+from src.evaluation import points
+import chess
+
+
+# Reference: https://www.chessprogramming.org/Move_Ordering
+
+# Score bands for move ordering, highest searched first
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORES = ((1 << 23) + 1, 1 << 23)
+MAX_HISTORY = 1 << 22
+
+# Fixed piece points indexed by piece type
+PIECE_POINTS = [0] + [points[chess.piece_symbol(piece_type).upper()] for piece_type in chess.PIECE_TYPES]
+
+# Most valuable victim - least valuable attacker score, indexed by [victim piece type][attacker piece type]
+MVV_LVA = [[0] * 7 for _ in range(7)]
+for victim in chess.PIECE_TYPES:
+    for attacker in chess.PIECE_TYPES:
+        MVV_LVA[victim][attacker] = 10 * PIECE_POINTS[victim] - attacker
+
+class MoveOrderer():
+    """
+    Move ordering shared by all searches: hash move first, then captures and promotions by MVV-LVA,
+    then killer moves for the current ply, then quiet moves by history score.
+    """
+    def __init__(self, max_ply = 64):
+        """
+        Initialize move ordering tables.
+
+        Parameters
+        ----------
+        max_ply : int, default=64
+            Maximum number of plies from the root to keep killer moves for.
+        """
+        self.max_ply = max_ply
+        self.killers = [[None, None] for _ in range(max_ply)]
+        # History scores indexed by [color][from square][to square]
+        self.history = [[[0] * 64 for _ in range(64)] for _ in chess.COLORS]
+
+    def new_search(self):
+        """
+        Prepare for a new search: forget killer moves and age history scores.
+        """
+        self.killers = [[None, None] for _ in range(self.max_ply)]
+        self.age_history()
+
+    def age_history(self):
+        """
+        Halve all history scores so that older cutoffs count less than recent ones.
+        """
+        for color_table in self.history:
+            for row in color_table:
+                for to_square in range(64):
+                    row[to_square] >>= 1
+
+    def capture_score(self, board, move):
+        """
+        Get the MVV-LVA score of a capture or promotion.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the board state before the move.
+        move : chess.Move
+            The move to score.
+
+        Returns
+        -------
+        int or None
+            MVV-LVA score, or None if the move is neither a capture nor a promotion.
+        """
+        score = None
+        if board.is_capture(move):
+            attacker = board.piece_type_at(move.from_square)
+            victim = chess.PAWN if board.is_en_passant(move) else board.piece_type_at(move.to_square)
+            score = MVV_LVA[victim][attacker]
+        if move.promotion is not None:
+            score = (score or 0) + 10 * PIECE_POINTS[move.promotion]
+        return score
+
+    def score_move(self, board, move, ply, hash_move = None):
+        """
+        Get the ordering score of a move. Moves with higher scores are searched first.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the board state before the move.
+        move : chess.Move
+            The move to score.
+        ply : int
+            Number of plies from the root.
+        hash_move : chess.Move, default=None
+            Best move stored for the board state, searched before all other moves.
+
+        Returns
+        -------
+        int
+            Ordering score of the move.
+        """
+        if move == hash_move:
+            return HASH_MOVE_SCORE
+
+        capture_score = self.capture_score(board, move)
+        if capture_score is not None:
+            return CAPTURE_SCORE + capture_score
+
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if move == killers[0]:
+                return KILLER_SCORES[0]
+            if move == killers[1]:
+                return KILLER_SCORES[1]
+
+        return self.history[board.turn][move.from_square][move.to_square]
+
+    def order_moves(self, board, moves, ply, hash_move = None):
+        """
+        Sort moves so that the most promising ones are searched first.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+        moves : list of chess.Move
+            Legal moves from the current board state.
+        ply : int
+            Number of plies from the root.
+        hash_move : chess.Move, default=None
+            Best move stored for the board state, searched before all other moves.
+
+        Returns
+        -------
+        list of chess.Move
+            The moves in search order.
+        """
+        return sorted(moves, key = lambda move: self.score_move(board, move, ply, hash_move), reverse = True)
+
+    def record_cutoff(self, board, move, ply, depth):
+        """
+        Update the killer moves and history scores after a move caused a beta cutoff.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the board state before the move.
+        move : chess.Move
+            The move that caused the cutoff.
+        ply : int
+            Number of plies from the root.
+        depth : int
+            The remaining search depth at the board state.
+        """
+        # Killer moves and history scores only apply to quiet moves
+        if board.is_capture(move) or move.promotion is not None:
+            return
+
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+        history = self.history[board.turn]
+        history[move.from_square][move.to_square] += depth * depth
+        if history[move.from_square][move.to_square] > MAX_HISTORY:
+            self.age_history()
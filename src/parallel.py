@@ -0,0 +1,233 @@
+from src.ordering import MoveOrderer
+from src.evaluation import IncrementalEvaluator
+from src.search import Searcher, SearchAborted, SearchStats
+from src.transposition import TranspositionTable
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import chess
+import time
+
+
+# Reference: https://www.chessprogramming.org/Parallel_Search
+
+# Worker process state, set up by init_worker()
+worker_bound = None
+worker_tt = None
+worker_search_id = None
+
+def init_worker(shared_bound, tt_size):
+    """
+    Set up a worker process of the parallel search.
+
+    Parameters
+    ----------
+    shared_bound : multiprocessing.Value
+        Best score found so far at the root, from the point of view of the side to move at the root.
+    tt_size : int
+        Number of slots in the worker's transposition table.
+    """
+    global worker_bound, worker_tt
+    worker_bound = shared_bound
+    worker_tt = TranspositionTable(tt_size)
+
+def search_root_move(search_id, root_fen, move_stack, root_move, depth, fail_hard, quiescence, wall_deadline):
+    """
+    Search one root move in a worker process, using the shared root bound as the alpha-beta window.
+
+    Parameters
+    ----------
+    search_id : int
+        Number of the search the root move belongs to. The worker's transposition table is aged when it changes.
+    root_fen : str
+        FEN of the board state at the start of the game.
+    move_stack : list of str
+        Moves played from root_fen to the current board state, in UCI format.
+    root_move : str
+        The root move to search, in UCI format.
+    depth : int
+        The search depth, including the root move.
+    fail_hard : bool
+        True to use the fail-hard version of alpha-beta pruning, False to use the fail-soft version.
+    quiescence : bool
+        True to extend the search at the leaves with a capture-only quiescence search.
+    wall_deadline : float or None
+        Value of time.time() after which the search is aborted. If None, there is no time limit.
+
+    Returns
+    -------
+    tuple of str or None
+        Principal variation starting with the root move, or None if the search was aborted.
+    int or None
+        Heuristic value of the root move, or None if the search was aborted.
+    bool
+        True if the value is exact, False if it is only an upper bound because the move is no better
+        than the best root move so far.
+    SearchStats
+        Statistics of the search of the root move.
+    """
+    global worker_search_id
+    if search_id != worker_search_id:
+        worker_tt.new_search()
+        worker_search_id = search_id
+
+    board = chess.Board(root_fen)
+    for move in move_stack:
+        board.push_uci(move)
+    root_white = board.turn
+    board.push_uci(root_move)
+
+    deadline = None
+    if wall_deadline is not None:
+        deadline = time.perf_counter() + (wall_deadline - time.time())
+    searcher = Searcher(board, tt = worker_tt, fail_hard = fail_hard, deadline = deadline, quiescence = quiescence,
+                        evaluator = IncrementalEvaluator(board))
+
+    # Only a score better than the best root score so far matters
+    bound = worker_bound.value
+    if root_white:
+        alpha, beta = bound, float('inf')
+    else:
+        alpha, beta = float('-inf'), -bound
+
+    try:
+        value = searcher.search(depth - 1, not root_white, alpha, beta)
+    except SearchAborted:
+        return None, None, False, searcher.stats
+
+    score = value if root_white else -value
+    with worker_bound.get_lock():
+        if score > worker_bound.value:
+            worker_bound.value = score
+
+    pv = (root_move,) + tuple(move.uci() for move in searcher.principal_variation())
+    return pv, value, score > bound, searcher.stats
+
+class ParallelSearch():
+    """
+    Alpha-beta search with iterative deepening that splits the root moves over a pool of worker processes.
+    The first root move is searched alone to set a bound (young brothers wait), then the other root moves are
+    searched in parallel. Workers share the best root score so far as their alpha-beta bound, and each keeps
+    its own transposition table.
+    """
+    def __init__(self, workers, fail_hard = True, quiescence = False, tt_size = 2 ** 18):
+        """
+        Initialize search and start the worker processes.
+
+        Parameters
+        ----------
+        workers : int
+            Number of worker processes.
+        fail_hard : bool, default=True
+            True to use the fail-hard version of alpha-beta pruning, False to use the fail-soft version.
+        quiescence : bool, default=False
+            True to extend the search at the leaves with a capture-only quiescence search.
+        tt_size : int, default=2**18
+            Number of slots in each worker's transposition table.
+        """
+        self.fail_hard = fail_hard
+        self.quiescence = quiescence
+        self.shared_bound = multiprocessing.Value('d', float('-inf'))
+        self.executor = ProcessPoolExecutor(max_workers = workers, initializer = init_worker,
+                                            initargs = (self.shared_bound, tt_size))
+        self.orderer = MoveOrderer()
+        self.search_id = 0
+        # Root move searches submitted in the current iteration
+        self.futures = []
+
+        # Statistics of the last search, summed over all workers
+        self.stats = SearchStats()
+
+    def search(self, board, max_depth, time_limit = None, callback = None):
+        """
+        Search with iterative deepening. An iteration in which any root move runs out of time is discarded.
+        The first iteration always completes.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board representing the current board state.
+        max_depth : int
+            The maximum search depth for alpha-beta.
+        time_limit : float, default=None
+            Time in seconds after which the search is stopped. If None, there is no time limit.
+        callback : callable, default=None
+            Called with the SearchStats after each completed iteration.
+
+        Returns
+        -------
+        tuple of str
+            Principal variation of the deepest completed iteration.
+        int
+            Final heuristic value of the deepest completed iteration.
+        int
+            Depth of the deepest completed iteration.
+        SearchStats
+            Statistics of the whole search, summed over all workers.
+        """
+        wall_deadline = None if time_limit is None else time.time() + time_limit
+        root_fen = board.root().fen()
+        move_stack = [move.uci() for move in board.move_stack]
+        root_moves = self.orderer.order_moves(board, list(board.legal_moves), 0)
+        maximize = 1 if board.turn else -1
+        self.search_id += 1
+
+        start = time.perf_counter()
+        stats = self.stats = SearchStats()
+        moves, value, completed_depth = (), None, 0
+        for depth in range(1, max_depth + 1):
+            iteration_start = time.perf_counter()
+            iteration_nodes, iteration_qnodes = stats.nodes, stats.qnodes
+            deadline = wall_deadline if depth > 1 else None
+            if len(root_moves) == 0 or (deadline is not None and time.time() >= deadline):
+                break
+
+            # Search the first move alone, so that the other moves are searched with its score as the bound
+            self.shared_bound.value = float('-inf')
+            self.futures = [self.executor.submit(search_root_move, self.search_id, root_fen, move_stack,
+                                                 root_moves[0].uci(), depth, self.fail_hard, self.quiescence, deadline)]
+            if self.futures[0].result()[0] is not None:
+                self.futures += [self.executor.submit(search_root_move, self.search_id, root_fen, move_stack, move.uci(),
+                                                      depth, self.fail_hard, self.quiescence, deadline)
+                                 for move in root_moves[1:]]
+
+            # Collect exact results in root move order, so ties go to the earlier move
+            results = []
+            aborted = False
+            for move, future in zip(root_moves, self.futures):
+                pv, move_value, exact, move_stats = future.result()
+                stats.add(move_stats)
+                if pv is None:
+                    aborted = True
+                elif exact:
+                    results.append((move, pv, move_value))
+            if aborted or len(results) == 0:
+                break
+
+            best_move, best_pv, best_value = results[0]
+            for move, pv, move_value in results[1:]:
+                if maximize * move_value > maximize * best_value:
+                    best_move, best_pv, best_value = move, pv, move_value
+            moves, value, completed_depth = best_pv, best_value, depth
+
+            # Search the best move first in the next iteration
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+
+            now = time.perf_counter()
+            stats.seconds = now - start
+            stats.iterations.append({"depth": depth, "seconds": now - iteration_start,
+                                     "nodes": stats.nodes - iteration_nodes, "qnodes": stats.qnodes - iteration_qnodes,
+                                     "value": value, "pv": moves})
+            if callback is not None:
+                callback(stats)
+
+        stats.seconds = time.perf_counter() - start
+        return moves, value, completed_depth, stats
+
+    def close(self):
+        """
+        Shut down the worker processes. Root move searches that have not started are cancelled.
+        """
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown()
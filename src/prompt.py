@@ -0,0 +1,123 @@
+import chess
+import math
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Reference: https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+
+# Version of the prompt, part of the commentary cache key so that a changed prompt does not reuse old commentary
+PROMPT_VERSION = 2
+
+# Instructions sent first in every request. They never change, so that servers caching prompt prefixes can reuse them
+SYSTEM_MESSAGE = "You are a chess tutor for a beginner. Given a position (FEN), a move suggested for the side to move (SAN) " \
+                 "and possibly the engine's evaluation (white's view) and line, comment on the move as concisely as possible."
+
+# Maximum number of plies of the engine's principal variation in the prompt
+PV_LENGTH = 4
+
+# Scores at least this far from 0 are mate scores, see chess.engine.Score.score(mate_score = 100000)
+MATE_THRESHOLD = 90000
+
+# Tokenizer of the chat model, loaded on first use
+encoding = None
+
+def count_tokens(text):
+    """
+    Count the tokens of a text. Uses tiktoken if it is installed and its encoding can be loaded,
+    otherwise estimates 4 characters per token.
+
+    Parameters
+    ----------
+    text : str
+        The text.
+
+    Returns
+    -------
+    int
+        Number of tokens.
+    """
+    global encoding, tiktoken
+    if tiktoken is not None and encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        except Exception:
+            # tiktoken downloads the encoding on first use, which fails offline
+            tiktoken = None
+    if tiktoken is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text))
+
+def count_message_tokens(messages):
+    """
+    Count the prompt tokens of chat messages, including the tokens that mark the start of each message and of the reply.
+
+    Parameters
+    ----------
+    messages : list of dict
+        Chat messages with "role" and "content".
+
+    Returns
+    -------
+    int
+        Number of prompt tokens.
+    """
+    return sum(4 + count_tokens(message["content"]) for message in messages) + 3
+
+def format_score(score):
+    """
+    Get a short description of an engine score.
+
+    Parameters
+    ----------
+    score : int
+        Score in centipawns from white's point of view, with mates scored as in MATE_THRESHOLD.
+
+    Returns
+    -------
+    str
+        Score in pawns, e.g. "+0.35", or the mate, e.g. "white mates in 3".
+    """
+    if abs(score) >= MATE_THRESHOLD:
+        winner = "white" if score > 0 else "black"
+        return "{} mates in {}".format(winner, 100000 - abs(score))
+    return "{:+.2f}".format(score / 100)
+
+def build_prompt(board, move, score = None, pv = None):
+    """
+    Build the chat messages asking for commentary on a suggested move.
+    The board state is sent as FEN and the move in SAN, with the fixed system message first.
+
+    Parameters
+    ----------
+    board : chess.Board
+        Chess board representing the board state the move is suggested in.
+    move : chess.Move
+        The suggested move.
+    score : int, default=None
+        Engine score of the board state in centipawns from white's point of view. If None, it is left out.
+    pv : tuple of str, default=None
+        Engine principal variation in UCI format, starting with the suggested move. If None, it is left out.
+
+    Returns
+    -------
+    list of dict
+        Chat messages with "role" and "content".
+    """
+    lines = ["FEN: {}".format(board.fen()), "Move: {}".format(board.san(move))]
+    if score is not None:
+        lines.append("Eval: {}".format(format_score(score)))
+    if pv is not None and len(pv) > 1:
+        try:
+            lines.append("Line: {}".format(board.variation_san([chess.Move.from_uci(uci) for uci in pv[:PV_LENGTH]])))
+        except ValueError:
+            # The variation does not belong to this board state
+            pass
+
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": "\n".join(lines)},
+    ]
@@ -0,0 +1,257 @@
+import pygame
+
+
+# Reference: https://www.pygame.org/docs/tut/newbieguide.html (dirty rect animation)
+
+# Colors
+WHITE = (255, 255, 255)
+BLUE = (50, 255, 255)
+BLACK = (0, 0, 0)
+BACKGROUND = (232, 181, 132)
+BOARD_OUTLINE = (79, 40, 3)
+DARK_SQUARE = (216, 140, 68)
+LIGHT_SQUARE = (255, 204, 156)
+LATEST_MOVE = (120, 148, 84)
+
+# Width of the board border in hundredths of a square
+BORDER_OFFSET = 6
+
+# Letters and numbers to mark the sides of the board to denote squares
+CHARACTER_LIST = ['A','B','C','D','E','F','G','H']
+NUMBER_LIST = ['8','7','6','5','4','3','2','1']
+
+# Fonts by file and size, since loading a font is slow
+fonts = {}
+
+def get_font(size, name = 'freesansbold.ttf'):
+    """
+    Get a font, loading it on first use.
+
+    Parameters
+    ----------
+    size : int
+        Font size in pixels.
+    name : str, default='freesansbold.ttf'
+        Font file.
+
+    Returns
+    -------
+    pygame.font.Font
+        The font.
+    """
+    key = (name, size)
+    if key not in fonts:
+        fonts[key] = pygame.font.Font(name, size)
+    return fonts[key]
+
+class BoardRenderer():
+    """
+    Draws the chess board from a cached layer holding the background, border, squares, grid lines and labels.
+    Only squares whose piece or highlight changed since the last frame are redrawn, and the side panel is
+    only redrawn when its text changed. The layer is rebuilt when the window size or board orientation changes.
+    """
+    def __init__(self):
+        """
+        Initialize renderer with nothing drawn.
+        """
+        self.layer = None
+        self.layer_key = None
+        # Piece symbol and highlight color drawn on each display square, None if the square must be redrawn
+        self.squares = [None] * 64
+        # Text drawn in the side panel, None if the panel must be redrawn
+        self.panel_key = None
+
+    def invalidate(self):
+        """
+        Redraw everything on the next frame, e.g. after the window was recreated.
+        """
+        self.layer_key = None
+
+    def build_layer(self, size, square_size, board_offset, human_black, font):
+        """
+        Draw the parts of the window that only change with its size or the board orientation.
+
+        Parameters
+        ----------
+        size : tuple of int
+            Width and height of the window.
+        square_size : float
+            Width of a board square in pixels.
+        board_offset : float
+            Distance in pixels from the top and left edges of the window to the board.
+        human_black : bool
+            True if the board is shown from black's point of view.
+        font : pygame.font.Font
+            Font of the board labels.
+
+        Returns
+        -------
+        pygame.Surface
+            The layer, the size of the window.
+        """
+        layer = pygame.Surface(size).convert()
+        layer.fill(BACKGROUND)
+
+        # Draw border
+        pygame.draw.rect(layer, BOARD_OUTLINE, pygame.Rect(board_offset - (square_size / 100 * BORDER_OFFSET),
+                                                           board_offset - (square_size / 100 * BORDER_OFFSET),
+                                                           8 * square_size + (2 * square_size / 100) * BORDER_OFFSET,
+                                                           8 * square_size + (2 * square_size / 100) * BORDER_OFFSET), 5)
+
+        # Draw board squares, a1 is dark
+        for i in range(64):
+            color = DARK_SQUARE if (i % 8 + i // 8) % 2 == 0 else LIGHT_SQUARE
+            layer.fill(color, self.square_rect(i, square_size, board_offset))
+
+        # Draw letters and numbers
+        for i in range(8):
+            letter = CHARACTER_LIST[7 - i] if human_black else CHARACTER_LIST[i]
+            text_letter = font.render(letter, True, BLACK, BACKGROUND)
+            layer.blit(text_letter, text_letter.get_rect(center = (2 * board_offset + i * square_size, int(board_offset / 2))))
+
+            number = NUMBER_LIST[7 - i] if human_black else NUMBER_LIST[i]
+            text_number = font.render(number, True, BLACK, BACKGROUND)
+            layer.blit(text_number, text_number.get_rect(center = (int(board_offset / 2), 2 * board_offset + i * square_size)))
+
+        # Draw lines
+        self.draw_lines(layer, square_size, board_offset)
+        return layer
+
+    def square_rect(self, i, square_size, board_offset):
+        """
+        Get the area of a display square. Adjacent squares share no pixels and leave no gaps.
+
+        Parameters
+        ----------
+        i : int
+            Display square (0-63), with 0 in the bottom left corner of the window.
+        square_size : float
+            Width of a board square in pixels.
+        board_offset : float
+            Distance in pixels from the top and left edges of the window to the board.
+
+        Returns
+        -------
+        pygame.Rect
+            Area of the square.
+        """
+        left = int(board_offset + (i % 8) * square_size)
+        top = int(board_offset + (7 - i // 8) * square_size)
+        right = int(board_offset + (i % 8 + 1) * square_size)
+        bottom = int(board_offset + (8 - i // 8) * square_size)
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def draw_lines(self, surface, square_size, board_offset):
+        """
+        Draw the grid lines between the squares, within the surface's clipping area.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+            Surface to draw on.
+        square_size : float
+            Width of a board square in pixels.
+        board_offset : float
+            Distance in pixels from the top and left edges of the window to the board.
+        """
+        for i in range(1, 8):
+            pygame.draw.line(surface, WHITE, (board_offset + 0, board_offset + i * square_size),
+                             (board_offset + 8 * square_size, board_offset + i * square_size))
+            pygame.draw.line(surface, WHITE, (board_offset + i * square_size, board_offset),
+                             (board_offset + i * square_size, board_offset + 8 * square_size))
+
+    def draw_board(self, surface, board, pieces, human_black, highlight_squares, latest_move, square_size, board_offset,
+                   font):
+        """
+        Draw the board, redrawing only the squares that changed since the last frame.
+
+        Parameters
+        ----------
+        surface : pygame.Surface
+            The screen displayed in the game window.
+        board : chess.Board
+            Chess board representing the current board state.
+        pieces : dict
+            Piece images by piece symbol, scaled to the square size.
+        human_black : bool
+            True if the board is shown from black's point of view.
+        highlight_squares : list of int or None
+            Display squares (0-63) to draw a box around.
+        latest_move : bool
+            True if highlight_squares reflects the latest move, False if it reflects the moves of a selected piece.
+        square_size : float
+            Width of a board square in pixels.
+        board_offset : float
+            Distance in pixels from the top and left edges of the window to the board.
+        font : pygame.font.Font
+            Font of the board labels.
+
+        Returns
+        -------
+        list of pygame.Rect
+            Areas of the screen that were drawn on.
+        """
+        layer_key = (surface.get_size(), square_size, board_offset, human_black)
+        full = layer_key != self.layer_key
+        if full:
+            # Redraw everything
+            self.layer = self.build_layer(surface.get_size(), square_size, board_offset, human_black, font)
+            self.layer_key = layer_key
+            self.squares = [None] * 64
+            self.panel_key = None
+            surface.blit(self.layer, (0, 0))
+
+        dirty = []
+
+        highlight_color = LATEST_MOVE if latest_move else BLUE
+        highlighted = set(highlight_squares) if highlight_squares is not None else set()
+        changed = []
+        for i in range(64):
+            # The board is shown from black's point of view by rotating it
+            piece = board.piece_at(63 - i if human_black else i)
+            square = (None if piece is None else piece.symbol(), highlight_color if i in highlighted else None)
+            if square == self.squares[i]:
+                continue
+            self.squares[i] = square
+            changed.append((self.square_rect(i, square_size, board_offset), square))
+
+        for rect, square in changed:
+            if not full:
+                surface.blit(self.layer, rect, rect)
+            if square[0] is not None:
+                surface.blit(pieces[square[0]], rect.topleft)
+
+        # Grid lines are drawn over the pieces, once for the whole board or within each changed square
+        if full:
+            self.draw_lines(surface, square_size, board_offset)
+        else:
+            for rect, _ in changed:
+                surface.set_clip(rect)
+                self.draw_lines(surface, square_size, board_offset)
+                surface.set_clip(None)
+
+        for rect, square in changed:
+            if square[1] is not None:
+                pygame.draw.rect(surface, square[1], rect, 5)
+            dirty.append(rect)
+
+        return [surface.get_rect()] if full else dirty
+
+    def panel_changed(self, panel_key):
+        """
+        Check if the side panel must be redrawn, and record that it will be.
+
+        Parameters
+        ----------
+        panel_key : tuple
+            The text shown in the side panel.
+
+        Returns
+        -------
+        bool
+            True if the text differs from the drawn text or everything was redrawn since.
+        """
+        if panel_key == self.panel_key:
+            return False
+        self.panel_key = panel_key
+        return True
@@ -1,14 +1,716 @@
-from src.evaluation import get_board_points
+from src.evaluation import get_board_points, IncrementalEvaluator
+from src.ordering import MoveOrderer, PIECE_POINTS
+from src.transposition import position_key
+import chess
+import time
 
 
-def alpha_beta_fail_hard(board, depth, maximizing_player, alpha = float('-inf'), beta = float('inf'), moves_list = ()):
+# Maximum number of plies from the root that the search keeps a principal variation for
+MAX_PLY = 64
+
+# Number of nodes searched between checks of the time and node budget
+BUDGET_CHECK_INTERVAL = 1024
+
+# Safety margin for delta pruning in quiescence search
+DELTA_MARGIN = 200
+
+# Null-move pruning: depth reduction and minimum remaining depth
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+
+# Late move reductions: number of moves searched at full depth, minimum remaining depth and depth reduction
+LMR_FULL_DEPTH_MOVES = 3
+LMR_MIN_DEPTH = 3
+LMR_REDUCTION = 1
+
+# Initial half-width of the aspiration window around the previous iteration's score
+ASPIRATION_WINDOW = 50
+
+class SearchAborted(Exception):
+    """
+    Raised inside a search when its time or node budget runs out.
+    """
+    pass
+
+class SearchStats():
+    """
+    Work done by a search: node counts, evaluations, transposition table use, cutoffs and time per iteration.
+    """
+    def __init__(self):
+        """
+        Initialize all counters to zero.
+        """
+        self.nodes = 0
+        self.qnodes = 0
+        self.leaf_evals = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.seconds = 0.0
+        # One dict per completed iteration: depth, seconds, nodes, qnodes, value and pv
+        self.iterations = []
+
+    def total_nodes(self):
+        """
+        Get the number of main search and quiescence search nodes.
+
+        Returns
+        -------
+        int
+            Total number of nodes.
+        """
+        return self.nodes + self.qnodes
+
+    def nps(self):
+        """
+        Get the search speed.
+
+        Returns
+        -------
+        float
+            Total nodes per second, or 0.0 if no time was recorded.
+        """
+        if self.seconds <= 0:
+            return 0.0
+        return self.total_nodes() / self.seconds
+
+    def first_move_cutoff_rate(self):
+        """
+        Get the fraction of beta cutoffs caused by the first searched move, a measure of move ordering quality.
+
+        Returns
+        -------
+        float
+            Fraction of beta cutoffs on the first move, or 0.0 if there were no cutoffs.
+        """
+        if self.beta_cutoffs == 0:
+            return 0.0
+        return self.first_move_cutoffs / self.beta_cutoffs
+
+    def tt_hit_rate(self):
+        """
+        Get the fraction of transposition table probes that found the board state.
+
+        Returns
+        -------
+        float
+            Fraction of probes that hit, or 0.0 if there were no probes.
+        """
+        if self.tt_probes == 0:
+            return 0.0
+        return self.tt_hits / self.tt_probes
+
+    def add(self, other):
+        """
+        Add the counters of another search to these, e.g. to combine the workers of a parallel search.
+
+        Parameters
+        ----------
+        other : SearchStats
+            Statistics of the other search. Its time and iterations are not added.
+        """
+        self.nodes += other.nodes
+        self.qnodes += other.qnodes
+        self.leaf_evals += other.leaf_evals
+        self.tt_probes += other.tt_probes
+        self.tt_hits += other.tt_hits
+        self.beta_cutoffs += other.beta_cutoffs
+        self.first_move_cutoffs += other.first_move_cutoffs
+
+    def __str__(self):
+        depth = self.iterations[-1]["depth"] if len(self.iterations) > 0 else 0
+        return ("depth {} nodes {} qnodes {} evals {} time {:.2f}s nps {:.0f} tt hits {:.0%} first-move cutoffs {:.0%}"
+                .format(depth, self.nodes, self.qnodes, self.leaf_evals, self.seconds, self.nps(),
+                        self.tt_hit_rate(), self.first_move_cutoff_rate()))
+
+class Searcher():
+    """
+    Alpha-beta search over a single board using make/unmake (push/pop) instead of board copies.
+    The principal variation is tracked in a preallocated triangular table.
+    """
+    def __init__(self, board, tt = None, fail_hard = True, max_ply = MAX_PLY, deadline = None, node_limit = None, orderer = None,
+                 quiescence = False, evaluator = None, eval_cache = None, pvs = True, null_move = True, lmr = True,
+                 stop_event = None):
+        """
+        Initialize search.
+
+        Parameters
+        ----------
+        board : chess.Board
+            Chess board to search from. Moves are pushed and popped on this board during the search,
+            and it is back in its original state when the search returns.
+        tt : TranspositionTable, default=None
+            Table of previously searched board states to consult and update. If None, no table is used.
+        fail_hard : bool, default=True
+            True to use the fail-hard version of alpha-beta pruning, False to use the fail-soft version.
+        max_ply : int, default=MAX_PLY
+            Maximum number of plies from the root. Board states at this ply are evaluated as leaves.
+        deadline : float, default=None
+            Value of time.perf_counter() after which the search is aborted. If None, there is no time limit.
+        node_limit : int, default=None
+            Number of searched nodes after which the search is aborted. If None, there is no node limit.
+        orderer : MoveOrderer, default=None
+            Move ordering tables. If None, new ones are created for this search.
+        quiescence : bool, default=False
+            True to extend the search at the leaves with a capture-only quiescence search.
+        evaluator : IncrementalEvaluator, default=None
+            Evaluator kept up to date on every push and pop of the search. If None, leaves are evaluated
+            with eval_cache or get_board_points().
+        eval_cache : EvaluationCache, default=None
+            Cache of heuristic values to evaluate leaves with when there is no evaluator.
+        pvs : bool, default=True
+            True to use principal variation search in negamax().
+        null_move : bool, default=True
+            True to use null-move pruning in negamax().
+        lmr : bool, default=True
+            True to use late move reductions in negamax().
+        stop_event : threading.Event, default=None
+            Event that aborts the search when set, e.g. by another thread. If None, only the budget aborts the search.
+        """
+        self.board = board
+        self.tt = tt
+        self.fail_hard = fail_hard
+        self.max_ply = max_ply
+        self.deadline = deadline
+        self.node_limit = node_limit
+        self.quiescence = quiescence
+        self.evaluator = evaluator
+        self.eval_cache = eval_cache
+        self.pvs = pvs
+        self.null_move = null_move
+        self.lmr = lmr
+        self.stop_event = stop_event
+        self.stats = SearchStats()
+        self.orderer = orderer if orderer is not None else MoveOrderer(max_ply)
+
+        # Move to search first at the root, e.g. the best move of the previous iteration
+        self.root_move = None
+
+        # Triangular PV table: row p holds the best line from ply p, in columns p to pv_length[p] - 1
+        self.pv_table = [[None] * max_ply for _ in range(max_ply)]
+        self.pv_length = [0] * max_ply
+
+    def make_move(self, move):
+        """
+        Push a move on the search board, updating the incremental evaluator if there is one.
+
+        Parameters
+        ----------
+        move : chess.Move
+            The move to push.
+        """
+        if self.evaluator is not None:
+            self.evaluator.push(self.board, move)
+        self.board.push(move)
+
+    def unmake_move(self):
+        """
+        Pop the last move from the search board, updating the incremental evaluator if there is one.
+        """
+        self.board.pop()
+        if self.evaluator is not None:
+            self.evaluator.pop()
+
+    def evaluate(self):
+        """
+        Get the heuristic value for the current board state, counted as a leaf evaluation.
+
+        Returns
+        -------
+        int
+            The heuristic value for the board state.
+        """
+        self.stats.leaf_evals += 1
+        return self.static_evaluate()
+
+    def static_evaluate(self):
+        """
+        Get the heuristic value for the current board state without counting it, e.g. for pruning decisions
+        at interior nodes.
+
+        Returns
+        -------
+        int
+            The heuristic value for the board state.
+        """
+        if self.evaluator is not None:
+            return self.evaluator.evaluate(self.board)
+        if self.eval_cache is not None:
+            return self.eval_cache.evaluate(self.board)
+        return get_board_points(self.board)
+
+    def record_probe(self, score, hash_move):
+        """
+        Count a transposition table probe.
+
+        Parameters
+        ----------
+        score : int or None
+            Score returned by TranspositionTable.lookup().
+        hash_move : chess.Move or None
+            Move returned by TranspositionTable.lookup().
+        """
+        self.stats.tt_probes += 1
+        if score is not None or hash_move is not None:
+            self.stats.tt_hits += 1
+
+    def record_cutoff(self, move, ply, depth, index):
+        """
+        Count a beta cutoff and update the move ordering tables.
+
+        Parameters
+        ----------
+        move : chess.Move
+            The move that caused the cutoff.
+        ply : int
+            Number of plies from the root.
+        depth : int
+            The remaining search depth at the board state.
+        index : int
+            Position of the move in the search order, 0 for the first searched move.
+        """
+        self.stats.beta_cutoffs += 1
+        if index == 0:
+            self.stats.first_move_cutoffs += 1
+        self.orderer.record_cutoff(self.board, move, ply, depth)
+
+    def out_of_budget(self):
+        """
+        Check if the time or node budget of the search has run out, or the search was stopped.
+
+        Returns
+        -------
+        bool
+            True if the search should be aborted, False if not.
+        """
+        if self.stop_event is not None and self.stop_event.is_set():
+            return True
+        if self.node_limit is not None and self.stats.total_nodes() >= self.node_limit:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def principal_variation(self):
+        """
+        Get the principal variation found by the last search.
+
+        Returns
+        -------
+        list of chess.Move
+            Best line of play from the root board state.
+        """
+        return self.pv_table[0][:self.pv_length[0]]
+
+    def update_pv(self, ply, move):
+        """
+        Set the principal variation at a ply to a move followed by the principal variation of the next ply.
+
+        Parameters
+        ----------
+        ply : int
+            Number of plies from the root.
+        move : chess.Move
+            The new best move at this ply.
+        """
+        row = self.pv_table[ply]
+        row[ply] = move
+        next_length = self.pv_length[ply + 1]
+        row[ply + 1:next_length] = self.pv_table[ply + 1][ply + 1:next_length]
+        self.pv_length[ply] = next_length
+
+    def quiesce(self, maximizing_player, alpha, beta, ply):
+        """
+        Capture-only quiescence search, so that leaves are not evaluated in the middle of a capture sequence.
+        The side to move may stand pat on the static heuristic value instead of capturing.
+
+        Parameters
+        ----------
+        maximizing_player : bool
+            Whether or not the current tree depth aims to maximize or minimize the returned heuristic value.
+        alpha : float
+            The minimum score that the maximizing player is assured of.
+        beta : float
+            The maximum score that the minimizing player is assured of.
+        ply : int
+            Number of plies from the root.
+
+        Returns
+        -------
+        int
+            Final heuristic value.
+        """
+        board = self.board
+
+        # Abort if the time or node budget has run out
+        self.stats.qnodes += 1
+        if self.stats.qnodes % BUDGET_CHECK_INTERVAL == 0 and self.out_of_budget():
+            raise SearchAborted()
+
+        stand_pat = self.evaluate()
+        if ply >= self.max_ply - 1:
+            return stand_pat
+
+        # Maximizing level
+        if maximizing_player:
+            # Stand-pat cutoff
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            value = stand_pat
+
+            for move in self.orderer.order_moves(board, board.generate_legal_captures(), ply):
+                # Delta pruning: skip captures that cannot raise the score to alpha
+                if stand_pat + self.capture_gain(move) + DELTA_MARGIN < alpha:
+                    continue
+
+                self.make_move(move)
+                move_points = self.quiesce(False, alpha, beta, ply + 1)
+                self.unmake_move()
+
+                value = max(value, move_points)
+                alpha = max(alpha, value)
+                if value >= beta:
+                    break
+
+        # Minimizing level
+        else:
+            # Stand-pat cutoff
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+            value = stand_pat
+
+            for move in self.orderer.order_moves(board, board.generate_legal_captures(), ply):
+                # Delta pruning: skip captures that cannot lower the score to beta
+                if stand_pat - self.capture_gain(move) - DELTA_MARGIN > beta:
+                    continue
+
+                self.make_move(move)
+                move_points = self.quiesce(True, alpha, beta, ply + 1)
+                self.unmake_move()
+
+                value = min(value, move_points)
+                beta = min(beta, value)
+                if value <= alpha:
+                    break
+
+        return value
+
+    def capture_gain(self, move):
+        """
+        Get an upper estimate of how much a capture can change the heuristic value.
+
+        Parameters
+        ----------
+        move : chess.Move
+            A capture from the current board state.
+
+        Returns
+        -------
+        int
+            Points of the captured piece, plus the promotion gain for capture-promotions.
+        """
+        board = self.board
+        victim = chess.PAWN if board.is_en_passant(move) else board.piece_type_at(move.to_square)
+        gain = PIECE_POINTS[victim]
+        if move.promotion is not None:
+            gain += PIECE_POINTS[move.promotion] - PIECE_POINTS[chess.PAWN]
+        return gain
+
+    def negamax(self, depth, alpha = float('-inf'), beta = float('inf'), ply = 0, allow_null = True):
+        """
+        Negamax alpha-beta pruning (fail-soft) with principal variation search, null-move pruning
+        and late move reductions. Scores are from the point of view of the side to move.
+
+        Parameters
+        ----------
+        depth : int
+            The remaining search depth.
+        alpha : float, default=float('-inf')
+            The minimum score that the side to move is assured of.
+        beta : float, default=float('inf')
+            The maximum score that the side to move can get before the opponent avoids this board state.
+        ply : int, default=0
+            Number of plies from the root.
+        allow_null : bool, default=True
+            False right after a null move, so that two null moves are never played in a row.
+
+        Returns
+        -------
+        int
+            Final heuristic value for the side to move.
+        """
+        board = self.board
+        self.pv_length[ply] = ply
+        sign = 1 if board.turn == chess.WHITE else -1
+
+        # Abort if the time or node budget has run out
+        self.stats.nodes += 1
+        if self.stats.nodes % BUDGET_CHECK_INTERVAL == 0 and self.out_of_budget():
+            raise SearchAborted()
+
+        # Maximum search depth reached
+        if depth <= 0 or ply >= self.max_ply - 1:
+            if self.quiescence:
+                if sign == 1:
+                    return self.quiesce(True, alpha, beta, ply)
+                return -self.quiesce(False, -beta, -alpha, ply)
+            return sign * self.evaluate()
+
+        # Use the stored result if this board state was already searched deep enough.
+        # The table holds scores from white's point of view.
+        alpha_orig = alpha
+        hash_move = None
+        if self.tt is not None:
+            key = position_key(board)
+            white_alpha, white_beta = (alpha, beta) if sign == 1 else (-beta, -alpha)
+            score, hash_move = self.tt.lookup(key, depth, white_alpha, white_beta)
+            self.record_probe(score, hash_move)
+            if score is not None:
+                if hash_move is not None:
+                    self.pv_table[ply][ply] = hash_move
+                    self.pv_length[ply] = ply + 1
+                return sign * score
+
+        in_check = board.is_check()
+
+        # Null-move pruning: if passing still fails high, a real move will too.
+        # Skipped in check and when the side to move has only pawns, where zugzwang is likely.
+        if (self.null_move and allow_null and ply > 0 and not in_check and depth >= NULL_MOVE_MIN_DEPTH
+                and beta != float('inf')):
+            own = board.occupied_co[board.turn]
+            if own & (board.knights | board.bishops | board.rooks | board.queens) and sign * self.static_evaluate() >= beta:
+                self.make_move(chess.Move.null())
+                null_score = -self.negamax(depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, False)
+                self.unmake_move()
+                if null_score >= beta:
+                    return null_score
+
+        # No possible moves for current board state
+        legal_moves = list(board.legal_moves)
+        if len(legal_moves) == 0:
+            return sign * self.evaluate()
+
+        # Search the stored best move first, then the rest by move ordering score
+        first_move = self.root_move if ply == 0 and self.root_move is not None else hash_move
+        legal_moves = self.orderer.order_moves(board, legal_moves, ply, first_move)
+
+        value = float('-inf')
+        best_move = None
+        for index, move in enumerate(legal_moves):
+            quiet = not board.is_capture(move) and move.promotion is None
+            self.make_move(move)
+
+            if index == 0 or not self.pvs:
+                # Full window search for the first move
+                move_points = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Late move reduction for quiet moves late in the move order
+                reduction = 0
+                if (self.lmr and quiet and index >= LMR_FULL_DEPTH_MOVES and depth >= LMR_MIN_DEPTH
+                        and not in_check and not board.is_check()):
+                    reduction = LMR_REDUCTION
+
+                # Null window search to prove the move is no better than alpha
+                move_points = -self.negamax(depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if move_points > alpha and reduction > 0:
+                    move_points = -self.negamax(depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < move_points < beta:
+                    # The move may be better: re-search with the full window
+                    move_points = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+
+            self.unmake_move()
+
+            if move_points > value:
+                value = move_points
+                best_move = move
+                if value > alpha:
+                    alpha = value
+                    self.update_pv(ply, move)
+
+            # Beta cutoff
+            if alpha >= beta:
+                self.record_cutoff(move, ply, depth, index)
+                break
+
+        if self.tt is not None:
+            white_alpha, white_beta = (alpha_orig, beta) if sign == 1 else (-beta, -alpha_orig)
+            self.tt.store(key, depth, sign * value, white_alpha, white_beta, best_move)
+
+        return value
+
+    def search_aspiration(self, depth, previous_value):
+        """
+        Negamax search at the root inside a narrow window around the previous iteration's score,
+        widening the window on each side that fails.
+
+        Parameters
+        ----------
+        depth : int
+            The search depth.
+        previous_value : int or None
+            Heuristic value of the previous iteration, from white's point of view. If None, the full window is used.
+
+        Returns
+        -------
+        int
+            Final heuristic value, from white's point of view.
+        """
+        sign = 1 if self.board.turn == chess.WHITE else -1
+        if previous_value is None:
+            return sign * self.negamax(depth)
+
+        center = sign * previous_value
+        lower_width = upper_width = ASPIRATION_WINDOW
+        while True:
+            alpha = center - lower_width if lower_width is not None else float('-inf')
+            beta = center + upper_width if upper_width is not None else float('inf')
+            value = self.negamax(depth, alpha, beta)
+            if value <= alpha and lower_width is not None:
+                # Failed low: widen below, giving up on the window after a few tries
+                lower_width = lower_width * 4 if lower_width < 8 * ASPIRATION_WINDOW else None
+            elif value >= beta and upper_width is not None:
+                # Failed high: widen above
+                upper_width = upper_width * 4 if upper_width < 8 * ASPIRATION_WINDOW else None
+            else:
+                return sign * value
+
+    def search(self, depth, maximizing_player, alpha = float('-inf'), beta = float('inf'), ply = 0):
+        """
+        Alpha-beta pruning from the current board state.
+
+        Parameters
+        ----------
+        depth : int
+            The remaining search depth.
+        maximizing_player : bool
+            Whether or not the current tree depth aims to maximize or minimize the returned heuristic value.
+        alpha : float, default=float('-inf')
+            The minimum score that the maximizing player is assured of.
+        beta : float, default=float('inf')
+            The maximum score that the minimizing player is assured of.
+        ply : int, default=0
+            Number of plies from the root.
+
+        Returns
+        -------
+        int
+            Final heuristic value.
+        """
+        board = self.board
+        self.pv_length[ply] = ply
+
+        # Abort if the time or node budget has run out
+        self.stats.nodes += 1
+        if self.stats.nodes % BUDGET_CHECK_INTERVAL == 0 and self.out_of_budget():
+            raise SearchAborted()
+
+        # Maximum search depth reached
+        if depth == 0 or ply >= self.max_ply - 1:
+            if self.quiescence:
+                return self.quiesce(maximizing_player, alpha, beta, ply)
+            return self.evaluate()
+
+        # Use the stored result if this board state was already searched deep enough
+        alpha_orig, beta_orig = alpha, beta
+        hash_move = None
+        if self.tt is not None:
+            key = position_key(board)
+            score, hash_move = self.tt.lookup(key, depth, alpha, beta)
+            self.record_probe(score, hash_move)
+            if score is not None:
+                if hash_move is not None:
+                    self.pv_table[ply][ply] = hash_move
+                    self.pv_length[ply] = ply + 1
+                return score
+
+        # No possible moves for current board state
+        legal_moves = list(board.legal_moves)
+        if len(legal_moves) == 0:
+            return self.evaluate()
+
+        # Search the stored best move first, then the rest by move ordering score
+        first_move = self.root_move if ply == 0 and self.root_move is not None else hash_move
+        legal_moves = self.orderer.order_moves(board, legal_moves, ply, first_move)
+
+        best_move = None
+
+        # Maximizing level
+        if maximizing_player:
+            value = float('-inf')
+
+            # Iterate through all possible moves from current board state
+            for index, move in enumerate(legal_moves):
+                # Get minimized heuristic value for board state resulting from possible move
+                self.make_move(move)
+                move_points = self.search(depth - 1, False, alpha, beta, ply + 1)
+                self.unmake_move()
+
+                if move_points > value:
+                    value = move_points
+                    best_move = move
+                    self.update_pv(ply, move)
+
+                if self.fail_hard:
+                    # Beta cutoff
+                    if value > beta:
+                        self.record_cutoff(move, ply, depth, index)
+                        break
+                    # Update alpha
+                    alpha = max(alpha, value)
+                else:
+                    # Update alpha
+                    alpha = max(alpha, value)
+                    # Beta cutoff
+                    if value >= beta:
+                        self.record_cutoff(move, ply, depth, index)
+                        break
+
+        # Minimizing level
+        else:
+            value = float('inf')
+
+            # Iterate through all possible moves from current board state
+            for index, move in enumerate(legal_moves):
+                # Get maximized heuristic value for board state resulting from possible move
+                self.make_move(move)
+                move_points = self.search(depth - 1, True, alpha, beta, ply + 1)
+                self.unmake_move()
+
+                if move_points < value:
+                    value = move_points
+                    best_move = move
+                    self.update_pv(ply, move)
+
+                if self.fail_hard:
+                    # Alpha cutoff
+                    if value < alpha:
+                        self.record_cutoff(move, ply, depth, index)
+                        break
+                    # Update beta
+                    beta = min(beta, value)
+                else:
+                    # Update beta
+                    beta = min(beta, value)
+                    # Alpha cutoff
+                    if value <= alpha:
+                        self.record_cutoff(move, ply, depth, index)
+                        break
+
+        if self.tt is not None:
+            self.tt.store(key, depth, value, alpha_orig, beta_orig, best_move)
+
+        return value
+
+
+def alpha_beta_fail_hard(board, depth, maximizing_player, alpha = float('-inf'), beta = float('inf'), moves_list = (), tt = None):
     """
     Alpha-beta pruning, fail-hard version.
 
     Parameters
     ----------
     board : chess.Board
-        Chess board representing the current board state.
+        Chess board representing the current board state. Restored to its original state on return.
     depth : int
         The maximum search depth for alpha-beta.
     maximizing_player : bool
@@ -19,6 +721,8 @@ def alpha_beta_fail_hard(board, depth, maximizing_player, alpha = float('-inf'),
         The maximum score that the minimizing player is assured of.
     moves_list : tuple of str, default=()
         List of chess moves taken to get to the current board state.
+    tt : TranspositionTable, default=None
+        Table of previously searched board states to consult and update. If None, no table is used.
 
     Returns
     -------
@@ -27,71 +731,19 @@ def alpha_beta_fail_hard(board, depth, maximizing_player, alpha = float('-inf'),
     int
         Final heuristic value.
     """
-    # Maximum search depth reached or no possible moves for current board state
-    if depth == 0 or len(list(board.legal_moves)) == 0:
-        return moves_list, get_board_points(board)
-
-    # Maximizing level
-    if maximizing_player:
-        value = float('-inf')
-        final_moves_list = ()
-
-        # Iterate through all possible moves from current board state
-        for move in list(board.legal_moves):
-            board_copy = board.copy()
-            board_copy.push(move)
-            new_moves_list = moves_list + (move.uci(),)
-
-            # Get move list and minimized heuristic value for board state resulting from possible move
-            best_move, move_points = alpha_beta_fail_hard(board_copy, depth - 1, not maximizing_player, alpha, beta, new_moves_list)
-            if move_points > value:
-                final_moves_list = best_move
-                value = move_points
-
-            # Beta cutoff
-            if value > beta:
-                break
-
-            # Update alpha
-            alpha = max(alpha, value)
-
-        return final_moves_list, value
+    searcher = Searcher(board, tt = tt, fail_hard = True)
+    value = searcher.search(depth, maximizing_player, alpha, beta)
+    return moves_list + tuple(move.uci() for move in searcher.principal_variation()), value
 
-    # Minimizing level
-    else:
-        value = float('inf')
-        final_moves_list = ()
 
-        # Iterate through all possible moves from current board state
-        for move in list(board.legal_moves):
-            board_copy = board.copy()
-            board_copy.push(move)
-            new_moves_list = moves_list + (move.uci(),)
-
-            # Get move list and maximized heuristic value for board state resulting from possible move
-            best_move, move_points = alpha_beta_fail_hard(board_copy, depth - 1, not maximizing_player, alpha, beta, new_moves_list)
-            if move_points < value:
-                final_moves_list = best_move
-                value = move_points
-
-            # Alpha cutoff
-            if value < alpha:
-                break
-
-            # Update beta
-            beta = min(beta, value)
-
-        return final_moves_list, value
-
-
-def alpha_beta_fail_soft(board, depth, maximizing_player, alpha = float('-inf'), beta = float('inf'), moves_list = ()):
+def alpha_beta_fail_soft(board, depth, maximizing_player, alpha = float('-inf'), beta = float('inf'), moves_list = (), tt = None):
     """
     Alpha-beta pruning, fail-soft version.
 
     Parameters
     ----------
     board : chess.Board
-        Chess board representing the current board state.
+        Chess board representing the current board state. Restored to its original state on return.
     depth : int
         The maximum search depth for alpha-beta.
     maximizing_player : bool
@@ -102,6 +754,8 @@ def alpha_beta_fail_soft(board, depth, maximizing_player, alpha = float('-inf'),
         The maximum score that the minimizing player is assured of.
     moves_list : tuple of str, default=()
         List of chess moves taken to get to the current board state.
+    tt : TranspositionTable, default=None
+        Table of previously searched board states to consult and update. If None, no table is used.
 
     Returns
     -------
@@ -110,58 +764,112 @@ def alpha_beta_fail_soft(board, depth, maximizing_player, alpha = float('-inf'),
     int
         Final heuristic value.
     """
-    # Maximum search depth reached or no possible moves for current board state
-    if depth == 0 or len(list(board.legal_moves)) == 0:
-        return moves_list, get_board_points(board)
-
-    # Maximizing level
-    if maximizing_player:
-        value = float('-inf')
-        final_moves_list = ()
-
-        # Iterate through all possible moves from current board state
-        for move in list(board.legal_moves):
-            board_copy = board.copy()
-            board_copy.push(move)
-            new_moves_list = moves_list + (move.uci(),)
-
-            # Get move list and minimized heuristic value for board state resulting from possible move
-            best_move, move_points = alpha_beta_fail_soft(board_copy, depth - 1, not maximizing_player, alpha, beta, new_moves_list)
-            if move_points > value:
-                final_moves_list = best_move
-                value = move_points
-
-            # Update alpha
-            alpha = max(alpha, value)
-
-            # Beta cutoff
-            if value >= beta:
-                break
-
-        return final_moves_list, value
-
-    # Minimizing level
-    else:
-        value = float('inf')
-        final_moves_list = ()
+    searcher = Searcher(board, tt = tt, fail_hard = False)
+    value = searcher.search(depth, maximizing_player, alpha, beta)
+    return moves_list + tuple(move.uci() for move in searcher.principal_variation()), value
 
-        # Iterate through all possible moves from current board state
-        for move in list(board.legal_moves):
-            board_copy = board.copy()
-            board_copy.push(move)
-            new_moves_list = moves_list + (move.uci(),)
 
-            # Get move list and maximized heuristic value for board state resulting from possible move
-            best_move, move_points = alpha_beta_fail_soft(board_copy, depth - 1, not maximizing_player, alpha, beta, new_moves_list)
-            if move_points < value:
-                final_moves_list = best_move
-                value = move_points
+def iterative_deepening(board, max_depth, time_limit = None, node_limit = None, fail_hard = True, tt = None, orderer = None,
+                        quiescence = False, incremental = True, eval_cache = None, negamax = False, pvs = True,
+                        aspiration = True, null_move = True, lmr = True, callback = None, stop_event = None):
+    """
+    Alpha-beta pruning with iterative deepening under a time or node budget.
+    Searches depth 1, 2, ... up to max_depth, starting each iteration with the best move of the previous one.
+    An iteration that runs out of budget is discarded. The first iteration always completes.
 
-            # Update beta
-            beta = min(beta, value)
+    Parameters
+    ----------
+    board : chess.Board
+        Chess board representing the current board state. Restored to its original state on return.
+    max_depth : int
+        The maximum search depth for alpha-beta.
+    time_limit : float, default=None
+        Time in seconds after which the search is stopped. If None, there is no time limit.
+    node_limit : int, default=None
+        Number of searched nodes after which the search is stopped. If None, there is no node limit.
+    fail_hard : bool, default=True
+        True to use the fail-hard version of alpha-beta pruning, False to use the fail-soft version.
+    tt : TranspositionTable, default=None
+        Table of previously searched board states to consult and update. If None, no table is used.
+    orderer : MoveOrderer, default=None
+        Move ordering tables. If None, new ones are created for this search.
+    quiescence : bool, default=False
+        True to extend the search at the leaves with a capture-only quiescence search.
+    incremental : bool, default=True
+        True to evaluate leaves with an IncrementalEvaluator updated on every push and pop,
+        False to evaluate them with eval_cache or get_board_points().
+    eval_cache : EvaluationCache, default=None
+        Cache of heuristic values to evaluate leaves with when incremental is False.
+    negamax : bool, default=False
+        True to use negamax with the pruning techniques below, False to use the fail-hard or fail-soft
+        version of alpha-beta pruning as set by fail_hard.
+    pvs : bool, default=True
+        True to use principal variation search with negamax.
+    aspiration : bool, default=True
+        True to search each iteration after the first in an aspiration window with negamax.
+    null_move : bool, default=True
+        True to use null-move pruning with negamax.
+    lmr : bool, default=True
+        True to use late move reductions with negamax.
+    callback : callable, default=None
+        Called with the SearchStats after each completed iteration.
+    stop_event : threading.Event, default=None
+        Event that stops the search when set, like running out of budget. If None, only the budget stops the search.
 
-            # Alpha cutoff
-            if value <= alpha:
+    Returns
+    -------
+    tuple of str
+        Principal variation of the deepest completed iteration.
+    int
+        Final heuristic value of the deepest completed iteration.
+    int
+        Depth of the deepest completed iteration.
+    SearchStats
+        Statistics of the whole search, including the aborted iteration if there was one.
+    """
+    start = time.perf_counter()
+    deadline = None if time_limit is None else start + time_limit
+    evaluator = IncrementalEvaluator(board) if incremental else None
+    searcher = Searcher(board, tt = tt, fail_hard = fail_hard, orderer = orderer, quiescence = quiescence, evaluator = evaluator,
+                        eval_cache = eval_cache, pvs = pvs, null_move = null_move, lmr = lmr)
+    stack_size = len(board.move_stack)
+    stats = searcher.stats
+
+    moves, value, completed_depth = (), None, 0
+    for depth in range(1, max_depth + 1):
+        iteration_start = time.perf_counter()
+        iteration_nodes, iteration_qnodes = stats.nodes, stats.qnodes
+
+        # Budget only applies once there is a completed result to fall back on
+        if depth > 1:
+            searcher.deadline = deadline
+            searcher.node_limit = node_limit
+            searcher.stop_event = stop_event
+            if searcher.out_of_budget():
                 break
 
-        return final_moves_list, value
+        try:
+            if negamax:
+                iteration_value = searcher.search_aspiration(depth, value if aspiration else None)
+            else:
+                iteration_value = searcher.search(depth, board.turn)
+        except SearchAborted:
+            # Undo the moves that were pushed when the search was aborted
+            while len(board.move_stack) > stack_size:
+                searcher.unmake_move()
+            break
+
+        pv = searcher.principal_variation()
+        moves, value, completed_depth = tuple(move.uci() for move in pv), iteration_value, depth
+        if len(pv) > 0:
+            searcher.root_move = pv[0]
+
+        now = time.perf_counter()
+        stats.seconds = now - start
+        stats.iterations.append({"depth": depth, "seconds": now - iteration_start, "nodes": stats.nodes - iteration_nodes,
+                                 "qnodes": stats.qnodes - iteration_qnodes, "value": value, "pv": moves})
+        if callback is not None:
+            callback(stats)
+
+    stats.seconds = time.perf_counter() - start
+    return moves, value, completed_depth, stats
@@ -0,0 +1,31 @@
+import time
+
+
+class StartupTimer():
+    """
+    Report of the time taken by each startup step, printed as the steps finish.
+    """
+    def __init__(self, start = None):
+        """
+        Initialize timer.
+
+        Parameters
+        ----------
+        start : float, default=None
+            Time from time.perf_counter() at which startup began. If None, the current time is used.
+        """
+        self.start = time.perf_counter() if start is None else start
+        self.marks = []
+
+    def mark(self, step):
+        """
+        Record and print that a startup step finished. Can be called from any thread.
+
+        Parameters
+        ----------
+        step : str
+            Description of the step.
+        """
+        seconds = time.perf_counter() - self.start
+        self.marks.append((step, seconds))
+        print("[startup] {:<24}{:7.3f} s".format(step, seconds))
@@ -0,0 +1,159 @@
+from chess.polyglot import zobrist_hash
+import chess
+
+
+# Reference: https://www.chessprogramming.org/Transposition_Table
+
+# Board._transposition_key() is private to python-chess, so the slower Zobrist hash is used if it is missing
+FAST_KEY = hasattr(chess.Board, "_transposition_key")
+
+# Bound types for stored scores
+EXACT = 0   # Score is the exact heuristic value of the position
+LOWER = 1   # Score is a lower bound (search failed high)
+UPPER = 2   # Score is an upper bound (search failed low)
+
+def position_key(board):
+    """
+    Get the hash of a board state. Hashes the bitboards, side to move, castling rights and en passant square
+    that python-chess uses to detect repetitions, which is much faster than computing the Zobrist hash.
+    The hash is only comparable within one process. Falls back to the Zobrist hash if python-chess
+    does not provide the key.
+
+    Parameters
+    ----------
+    board : chess.Board
+        Chess board representing the current board state.
+
+    Returns
+    -------
+    int
+        64-bit hash of the board state.
+    """
+    if FAST_KEY:
+        return hash(board._transposition_key())
+    return zobrist_hash(board)
+
+class TranspositionTable():
+    """
+    Fixed-size hash table of previously searched board states, keyed by position_key().
+
+    Each slot holds a single entry (key, depth, bound, score, move, generation).
+    When two board states map to the same slot, the new entry replaces the old one if
+    the old entry is from an earlier search or was searched to a shallower or equal depth.
+    """
+    def __init__(self, size = 2 ** 18):
+        """
+        Initialize table.
+
+        Parameters
+        ----------
+        size : int, default=2**18
+            Number of slots in the table. Rounded down to a power of two.
+        """
+        self.size = 1 << max(0, int(size).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        """
+        Mark the start of a new search. Entries from earlier searches are kept for lookups
+        but are always replaceable.
+        """
+        self.generation += 1
+
+    def clear(self):
+        """
+        Remove all entries from the table.
+        """
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def probe(self, key):
+        """
+        Get the entry stored for a board state.
+
+        Parameters
+        ----------
+        key : int
+            Key of the board state from position_key().
+
+        Returns
+        -------
+        tuple or None
+            Entry (key, depth, bound, score, move, generation), or None if the board state is not stored.
+        """
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def lookup(self, key, depth, alpha, beta):
+        """
+        Check if a stored result can be used in place of searching a board state.
+
+        Parameters
+        ----------
+        key : int
+            Key of the board state from position_key().
+        depth : int
+            The remaining search depth for the board state.
+        alpha : float
+            The minimum score that the maximizing player is assured of.
+        beta : float
+            The maximum score that the minimizing player is assured of.
+
+        Returns
+        -------
+        int or None
+            Stored heuristic value if it is deep enough and decides the search window, None if not.
+        chess.Move or None
+            Best move stored for the board state, usable for move ordering.
+        """
+        entry = self.probe(key)
+        if entry is None:
+            return None, None
+
+        _, entry_depth, bound, score, move, _ = entry
+        if entry_depth >= depth:
+            if bound == EXACT:
+                return score, move
+            if bound == LOWER and score >= beta:
+                return score, move
+            if bound == UPPER and score <= alpha:
+                return score, move
+        return None, move
+
+    def store(self, key, depth, score, alpha, beta, move):
+        """
+        Store the result of searching a board state.
+
+        Parameters
+        ----------
+        key : int
+            Key of the board state from position_key().
+        depth : int
+            The search depth used for the board state.
+        score : int
+            Heuristic value returned by the search.
+        alpha : float
+            The alpha value the board state was searched with.
+        beta : float
+            The beta value the board state was searched with.
+        move : chess.Move or None
+            Best move found for the board state.
+        """
+        if score <= alpha:
+            bound = UPPER
+        elif score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+
+        index = key & self.mask
+        old = self.entries[index]
+        if old is None or old[0] == key or old[5] != self.generation or depth >= old[1]:
+            if move is None and old is not None and old[0] == key:
+                # Keep the known best move for ordering
+                move = old[4]
+            self.entries[index] = (key, depth, bound, score, move, self.generation)
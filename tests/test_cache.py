@@ -0,0 +1,64 @@
+from src.cache import PersistentCache
+import sqlite3
+import threading
+import time
+
+
+def test_sessions_sharing_a_file(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = PersistentCache(path, "entries", memory_entries = 1)
+    second = PersistentCache(path, "entries", memory_entries = 1)
+    second.put("a", 1)
+    second.put("b", 2)
+
+    # A read from the database does not keep the write lock from the other session
+    assert first.get("a") == 1
+    start = time.perf_counter()
+    second.put("c", 3)
+    assert time.perf_counter() - start < 1
+    assert first.get("c") == 3
+
+    first.close()
+    second.close()
+
+def test_locked_database_drops_store(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = PersistentCache(path, "entries", memory_entries = 1)
+    cache.connection.execute("PRAGMA busy_timeout = 10")
+    cache.put("a", 1)
+
+    # The store fails while another session writes, and the value is only kept in memory
+    other = sqlite3.connect(path, timeout = 0)
+    other.execute("BEGIN EXCLUSIVE")
+    cache.put("b", 2)
+    assert cache.stats()["errors"] == 1
+    assert cache.get("b") == 2
+    other.rollback()
+    other.close()
+
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    cache.close()
+
+def test_threads_sharing_a_cache(tmp_path):
+    cache = PersistentCache(str(tmp_path / "cache.db"), "entries", memory_entries = 8)
+    errors = []
+
+    def work(offset):
+        try:
+            for i in range(500):
+                key = str((offset + i) % 32)
+                cache.put(key, i)
+                cache.get(str(i % 32))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target = work, args = (offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.stats()["errors"] == 0
+    cache.close()
@@ -0,0 +1,55 @@
+from src.evaluation import IncrementalEvaluator, get_board_points
+import chess
+import random
+import pytest
+
+
+# Board states with captures of queens and pieces around the end stage threshold, and promotions
+FENS = [
+    chess.STARTING_FEN,
+    "r3k2q/8/3n4/8/8/3Q4/8/5BK1 w - - 0 1",
+    "4k3/4P3/8/8/8/8/3q4/4K2R w K - 0 1",
+    "r1bqk2r/pP3ppp/2n5/3p4/8/2N2N2/P1PQ1PpP/R3KB1R w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+]
+
+def check_playout(fen, seed, tapered, plies = 80):
+    """
+    Play random moves, preferring captures and promotions, and check the incremental evaluation
+    against the full evaluation after every push and pop.
+    """
+    rng = random.Random(seed)
+    board = chess.Board(fen)
+    evaluator = IncrementalEvaluator(board, debug = True, tapered = tapered)
+    values = [evaluator.evaluate(board)]
+
+    for _ in range(plies):
+        moves = list(board.legal_moves)
+        if len(moves) == 0:
+            break
+        forcing = [move for move in moves if board.is_capture(move) or move.promotion is not None]
+        move = rng.choice(forcing if len(forcing) > 0 and rng.random() < 0.7 else moves)
+        evaluator.push(board, move)
+        board.push(move)
+        values.append(evaluator.evaluate(board))
+
+    # Undoing every move restores the earlier values
+    while len(board.move_stack) > 0:
+        values.pop()
+        evaluator.pop()
+        board.pop()
+        assert evaluator.evaluate(board) == values[-1]
+
+@pytest.mark.parametrize("fen", FENS)
+@pytest.mark.parametrize("tapered", [False, True])
+def test_incremental_matches_full_evaluation(fen, tapered):
+    for seed in range(20):
+        check_playout(fen, seed, tapered)
+
+def test_queen_capture_near_endgame():
+    board = chess.Board("r3k2q/8/3n4/8/8/3Q4/8/5BK1 w - - 0 1")
+    evaluator = IncrementalEvaluator(board)
+    move = chess.Move.from_uci("d3d6")
+    evaluator.push(board, move)
+    board.push(move)
+    assert evaluator.evaluate(board) == get_board_points(board)
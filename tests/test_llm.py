@@ -0,0 +1,78 @@
+from src.llm import HTTPBackend, LLMClient, LLMError
+from src.mock_llm_server import MockLLMServer
+import threading
+import time
+import pytest
+
+
+MESSAGES = [{"role": "system", "content": "You are a chess tutor."}, {"role": "user", "content": "Move: e4"}]
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(**kwargs):
+        mock = MockLLMServer(**kwargs)
+        mock.start()
+        servers.append(mock)
+        return mock
+
+    yield start
+    for mock in servers:
+        mock.close()
+
+def test_retry_after_rate_limit(server):
+    mock = server(rate_limited = 1, retry_after = 0.2)
+    client = LLMClient(HTTPBackend(mock.url), base_delay = 0.01)
+    start = time.perf_counter()
+    assert client.complete(MESSAGES) == mock.reply
+    assert time.perf_counter() - start >= 0.2
+    assert mock.requests == 2
+    assert client.stats()["retries"] == 1
+
+def test_timeout_raises(server):
+    mock = server(delay = 1.0)
+    client = LLMClient(HTTPBackend(mock.url), timeout = 0.1, max_retries = 1, base_delay = 0.01)
+    with pytest.raises(LLMError) as error:
+        client.complete(MESSAGES)
+    assert error.value.retryable
+    stats = client.stats()
+    assert stats["retries"] == 1
+    assert stats["failures"] == 1
+
+def test_identical_requests_coalesced(server):
+    mock = server(delay = 0.3)
+    client = LLMClient(HTTPBackend(mock.url))
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(client.complete(MESSAGES))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [mock.reply] * 3
+    assert mock.requests == 1
+    assert client.stats()["coalesced"] == 2
+
+def test_streaming(server):
+    mock = server()
+    client = LLMClient(HTTPBackend(mock.url))
+    parts = []
+    assert client.complete(MESSAGES, on_text = parts.append) == mock.reply
+    assert len(parts) == len(mock.reply.split(" "))
+    assert parts[-1] == mock.reply
+    assert all(mock.reply.startswith(part) for part in parts)
+    # Streamed responses do not report usage, so the client counts the tokens
+    assert client.stats()["completion_tokens"] > 0
+
+def test_metrics(server):
+    mock = server()
+    client = LLMClient(HTTPBackend(mock.url))
+    client.complete(MESSAGES)
+    client.complete(MESSAGES, max_tokens = 50)
+    stats = client.stats()
+    assert stats["requests"] == 2
+    assert stats["successes"] == 2
+    assert stats["failures"] == 0
+    assert stats["prompt_tokens"] == 2 * sum(len(message["content"].split()) for message in MESSAGES)
+    assert stats["completion_tokens"] == 2 * len(mock.reply.split())
+    assert 0 < stats["latency_p50"] <= stats["latency_p95"]